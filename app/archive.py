@@ -0,0 +1,113 @@
+"""Archiving of old done tasks and their comments.
+
+Tasks that have been done for ARCHIVE_AFTER_DAYS (by ``updated_at``) move,
+with their comments, from ``tasks`` / ``comments`` to ``tasks_archive`` /
+``comments_archive``, keeping their ids, versions and timestamps. The live
+tables and their indexes then only hold what is still being worked on.
+``?include_archived=true`` on ``GET /tasks/`` and ``GET /comments/`` reads
+both.
+
+A run moves ARCHIVE_BATCH_SIZE tasks per transaction (see
+``crud.archive_done_tasks``) and pauses ARCHIVE_BATCH_PAUSE_SECONDS between
+batches, so locks stay short and replication and vacuum keep up; runs
+repeat every ARCHIVE_INTERVAL_MINUTES. On PostgreSQL a session advisory
+lock lets one worker at a time run, so the pause throttles the whole
+deployment rather than each worker.
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Optional, Tuple
+from sqlalchemy import text
+import config
+import crud
+import metrics
+from database import SessionLocal
+
+logger = logging.getLogger("teamwork.archive")
+
+# pg_try_advisory_lock key held by the archiving worker during a run
+LOCK_KEY = 7_140_324
+
+rows_archived = metrics.Counter("archived_rows_total", "Rows moved to the archive tables, by entity")
+
+def _try_lock(engine):
+    """A connection holding the run lock, True without PostgreSQL, None if another worker runs."""
+    if engine.dialect.name != "postgresql":
+        return True
+    connection = engine.connect()
+    locked = connection.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": LOCK_KEY})
+    # Session-level lock: it outlives this transaction, which mustn't stay open
+    connection.commit()
+    if not locked:
+        connection.close()
+        return None
+    return connection
+
+def _unlock(lock):
+    if lock is True:
+        return
+    try:
+        lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+        lock.commit()
+    finally:
+        lock.close()
+
+def _archive_batch(older_than: timedelta) -> Tuple[int, int]:
+    db = SessionLocal()
+    try:
+        return crud.archive_done_tasks(db, older_than, config.ARCHIVE_BATCH_SIZE)
+    finally:
+        db.close()
+
+async def run_once(engine) -> Tuple[int, int]:
+    """Archive everything currently due, batch by batch; returns (tasks, comments) moved."""
+    loop = asyncio.get_running_loop()
+    lock = await loop.run_in_executor(None, _try_lock, engine)
+    if lock is None:
+        logger.debug("Another worker is archiving")
+        return 0, 0
+    # Measured against the database clock, which wrote updated_at
+    older_than = timedelta(days=config.ARCHIVE_AFTER_DAYS)
+    total_tasks = total_comments = 0
+    try:
+        while True:
+            tasks, comments = await loop.run_in_executor(None, _archive_batch, older_than)
+            total_tasks += tasks
+            total_comments += comments
+            rows_archived.inc(tasks, entity="tasks")
+            rows_archived.inc(comments, entity="comments")
+            if tasks < config.ARCHIVE_BATCH_SIZE:
+                break
+            await asyncio.sleep(config.ARCHIVE_BATCH_PAUSE_SECONDS)
+    finally:
+        await loop.run_in_executor(None, _unlock, lock)
+    if total_tasks:
+        logger.info(
+            "Archived %d tasks and %d comments done for %s days", total_tasks, total_comments, config.ARCHIVE_AFTER_DAYS
+        )
+    return total_tasks, total_comments
+
+async def _run_forever(engine):
+    while True:
+        try:
+            await run_once(engine)
+        except Exception:
+            logger.exception("Archiving failed, retrying next run")
+        await asyncio.sleep(config.ARCHIVE_INTERVAL_MINUTES * 60)
+
+_task: Optional[asyncio.Task] = None
+
+def start(engine):
+    """Start the periodic archiver on the running event loop."""
+    global _task
+    if config.ARCHIVE_ENABLED:
+        _task = asyncio.get_running_loop().create_task(_run_forever(engine))
+
+async def stop():
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,236 @@
+"""Async versions of the single-entity CRUD endpoints from main.py.
+
+main.py includes this router ahead of its own routes when DB_MODE=async,
+so these handlers take over the matching paths. The ``:int`` convertors keep
+them from shadowing non-numeric siblings such as ``/tasks/bulk``.
+"""
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+import config
+import models
+import schemas
+import crud_async
+import group_commit
+import http_cache
+import includes
+import moderation
+from database import get_async_db
+
+router = APIRouter()
+
+async def expand(db: AsyncSession, objs, schema, model, include: List[str]) -> List[Dict[str, Any]]:
+    """main.expand for an AsyncSession."""
+    return await crud_async.serialize(db, objs, list(schema.model_fields), model, include)
+
+# Users endpoints
+@router.post("/users/", response_model=schemas.UserBase, status_code=status.HTTP_201_CREATED)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await crud_async.create_user(db=db, user=user)
+    if db_user is None:
+        email_taken = await crud_async.get_user_by_email(db, email=user.email) is not None
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered" if email_taken else "Username already taken"
+        )
+    return db_user
+
+@router.get("/users/{user_id:int}", response_model=schemas.UserDetail, response_model_exclude_unset=True)
+async def read_user(user_id: int, include: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    names = includes.parse_include(models.User, include)
+    db_user = await crud_async.get_user(db, user_id=user_id, include=names)
+    if db_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return (await expand(db, [db_user], schemas.UserBase, models.User, names))[0]
+
+@router.put("/users/{user_id:int}", response_model=schemas.UserBase)
+async def update_user(
+    user_id: int,
+    user: schemas.UserUpdate,
+    db: AsyncSession = Depends(get_async_db)
+):
+    db_user = await crud_async.update_user(db, user_id=user_id, user_update=user)
+    if db_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return db_user
+
+@router.delete("/users/{user_id:int}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    if not await crud_async.delete_user(db, user_id=user_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
+# Teams endpoints
+@router.post("/teams/", response_model=schemas.TeamBase, status_code=status.HTTP_201_CREATED)
+async def create_team(team: schemas.TeamBase, db: AsyncSession = Depends(get_async_db)):
+    return await crud_async.create_team(db=db, team=team)
+
+@router.get("/teams/{team_id:int}", response_model=schemas.TeamDetail, response_model_exclude_unset=True)
+async def read_team(team_id: int, include: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    names = includes.parse_include(models.Team, include)
+    db_team = await crud_async.get_team(db, team_id=team_id, include=names)
+    if db_team is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
+        )
+    return (await expand(db, [db_team], schemas.TeamBase, models.Team, names))[0]
+
+@router.put("/teams/{team_id:int}", response_model=schemas.TeamBase)
+async def update_team(
+    team_id: int,
+    team: schemas.TeamBase,
+    db: AsyncSession = Depends(get_async_db)
+):
+    db_team = await crud_async.update_team(db, team_id=team_id, team_update=team)
+    if db_team is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
+        )
+    return db_team
+
+@router.delete("/teams/{team_id:int}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_team(team_id: int, db: AsyncSession = Depends(get_async_db)):
+    if not await crud_async.delete_team(db, team_id=team_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
+        )
+
+# Projects endpoints
+@router.post("/projects/", response_model=schemas.ProjectBase, status_code=status.HTTP_201_CREATED)
+async def create_project(project: schemas.ProjectBase, db: AsyncSession = Depends(get_async_db)):
+    return await crud_async.create_project(db=db, project=project)
+
+@router.get("/projects/{project_id:int}", response_model=schemas.ProjectDetail, response_model_exclude_unset=True)
+async def read_project(
+    request: Request,
+    response: Response,
+    project_id: int,
+    include: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    names = includes.parse_include(models.Project, include)
+    db_project = await crud_async.get_project(db, project_id=project_id, include=names)
+    if db_project is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    if not names:
+        etag = http_cache.entity_etag(db_project)
+        if http_cache.not_modified(request, response, etag, db_project.updated_at):
+            return http_cache.not_modified_response(response)
+    return (await expand(db, [db_project], schemas.ProjectBase, models.Project, names))[0]
+
+@router.put("/projects/{project_id:int}", response_model=schemas.ProjectBase)
+async def update_project(
+    project_id: int,
+    project: schemas.ProjectBase,
+    db: AsyncSession = Depends(get_async_db)
+):
+    db_project = await crud_async.update_project(db, project_id=project_id, project_update=project)
+    if db_project is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    return db_project
+
+@router.delete("/projects/{project_id:int}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_project(project_id: int, db: AsyncSession = Depends(get_async_db)):
+    if not await crud_async.delete_project(db, project_id=project_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+
+# Tasks endpoints
+@router.post("/tasks/", response_model=schemas.TaskOut, status_code=status.HTTP_201_CREATED)
+async def create_task(task: schemas.TaskBase, db: AsyncSession = Depends(get_async_db)):
+    return await crud_async.create_task(db=db, task=task)
+
+@router.get("/tasks/{task_id:int}", response_model=schemas.TaskDetail, response_model_exclude_unset=True)
+async def read_task(task_id: int, include: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    names = includes.parse_include(models.Task, include)
+    db_task = await crud_async.get_task(db, task_id=task_id, include=names)
+    if db_task is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    return (await expand(db, [db_task], schemas.TaskOut, models.Task, names))[0]
+
+@router.put("/tasks/{task_id:int}", response_model=schemas.TaskOut)
+async def update_task(
+    task_id: int,
+    task: schemas.TaskBase,
+    db: AsyncSession = Depends(get_async_db)
+):
+    db_task = await crud_async.update_task(db, task_id=task_id, task_update=task)
+    if db_task is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    return db_task
+
+@router.delete("/tasks/{task_id:int}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_task(task_id: int, db: AsyncSession = Depends(get_async_db)):
+    if not await crud_async.delete_task(db, task_id=task_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+
+# Comments endpoints
+@router.post("/comments/", response_model=schemas.CommentBase, status_code=status.HTTP_201_CREATED)
+async def create_comment(comment: schemas.CommentBase, db: AsyncSession = Depends(get_async_db)):
+    moderation.ensure_allowed(comment.text)
+    if config.COMMENT_GROUP_COMMIT:
+        # The batch is written through the sync engine; wait for it off the event loop
+        return await run_in_threadpool(group_commit.comments.submit, comment)
+    return await crud_async.create_comment(db=db, comment=comment)
+
+@router.get("/comments/{comment_id:int}", response_model=schemas.CommentBase)
+async def read_comment(comment_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_comment = await crud_async.get_comment(db, comment_id=comment_id)
+    if db_comment is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Comment not found"
+        )
+    return db_comment
+
+@router.put("/comments/{comment_id:int}", response_model=schemas.CommentBase)
+async def update_comment(
+    comment_id: int,
+    comment: schemas.CommentBase,
+    db: AsyncSession = Depends(get_async_db)
+):
+    moderation.ensure_allowed(comment.text)
+    db_comment = await crud_async.update_comment(db, comment_id=comment_id, comment_update=comment)
+    if db_comment is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Comment not found"
+        )
+    return db_comment
+
+@router.delete("/comments/{comment_id:int}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_comment(comment_id: int, db: AsyncSession = Depends(get_async_db)):
+    if not await crud_async.delete_comment(db, comment_id=comment_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Comment not found"
+        )
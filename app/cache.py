@@ -0,0 +1,209 @@
+"""Read-through cache for single-entity lookups (users, teams, projects, tasks).
+
+Entries are the row's column values, never ORM objects, so a hit is
+re-attached to the caller's session with ``merge(load=False)`` and behaves
+like a loaded row (relationships still lazy-load). Lookups check the
+in-process LRU first and then the optional shared backend, which other
+workers fill as well. Writers in crud.py call ``invalidate`` after they
+commit; entries that another worker's local LRU still holds expire after
+CACHE_TTL_SECONDS. Secrets (``users.password``) are never cached.
+
+A miss can race a write: the load reads the old row, the writer commits and
+invalidates, then the load stores what it read. So ``invalidate`` bumps a
+generation the load compares before storing locally, and leaves a marker
+in the shared backend for CACHE_INVALIDATION_HOLD_SECONDS. Loads store
+there only if the key is absent, so they can't overwrite the marker.
+
+The shared backend is anything with ``get``/``set``/``delete`` on string
+keys and values: ``RedisBackend`` in production, ``MemoryBackend`` as a
+local stand-in (tests, single-host setups).
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import DateTime
+from sqlalchemy.orm import Session, make_transient_to_detached
+import config
+import metrics
+
+hits = metrics.Counter("cache_hits_total", "Entity cache hits by entity and tier")
+misses = metrics.Counter("cache_misses_total", "Entity cache misses by entity")
+evictions = metrics.Counter("cache_evictions_total", "Local entity cache evictions by reason")
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                evictions.inc(reason="expired")
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evictions.inc(reason="capacity")
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class MemoryBackend:
+    """In-process stand-in for a shared backend, with the same interface as RedisBackend."""
+
+    def __init__(self):
+        self._values: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: str, ttl: float, only_if_absent: bool = False):
+        with self._lock:
+            entry = self._values.get(key)
+            if only_if_absent and entry is not None and entry[0] >= time.monotonic():
+                return
+            self._values[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
+
+class RedisBackend:
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as exc:
+            raise ValueError("CACHE_BACKEND=redis needs the redis package (pip install -r requirements.txt)") from exc
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(key)
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, value: str, ttl: float, only_if_absent: bool = False):
+        self._client.set(key, value, px=int(ttl * 1000), nx=only_if_absent)
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+def _make_backend():
+    if config.CACHE_BACKEND == "redis":
+        return RedisBackend(config.CACHE_URL)
+    if config.CACHE_BACKEND == "memory":
+        return MemoryBackend()
+    return None
+
+local = LRUCache(config.CACHE_MAX_ENTRIES, config.CACHE_TTL_SECONDS)
+shared = _make_backend()
+
+# Shared-tier value left by invalidate; reads treat it as a miss
+INVALIDATED = ""
+# Columns never copied into the cache; they load from the row if accessed
+PRIVATE_COLUMNS = {"users": {"password"}}
+
+# Invalidation counters, keys hashed onto a fixed number of stripes
+_GENERATION_STRIPES = 1024
+_generations = [0] * _GENERATION_STRIPES
+_generations_lock = threading.Lock()
+
+def _stripe(key: str) -> int:
+    return hash(key) % _GENERATION_STRIPES
+
+def _key(model, row_id: int) -> str:
+    return f"entity:{model.__tablename__}:{row_id}"
+
+def _row_dict(obj) -> Dict[str, Any]:
+    private = PRIVATE_COLUMNS.get(obj.__tablename__, ())
+    return {
+        column.key: getattr(obj, column.key)
+        for column in obj.__table__.columns if column.key not in private
+    }
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, default=lambda value: value.isoformat())
+
+def _loads(model, raw: str) -> Dict[str, Any]:
+    data = json.loads(raw)
+    for column in model.__table__.columns:
+        if isinstance(column.type, DateTime) and data.get(column.key) is not None:
+            data[column.key] = datetime.fromisoformat(data[column.key])
+    return data
+
+def _set_local(key: str, data: Dict[str, Any], generation: int):
+    """Store unless ``key`` was invalidated since ``generation`` was read. The
+    check runs after the store, so a racing invalidate's delete still lands."""
+    local.set(key, data)
+    if _generations[_stripe(key)] != generation:
+        local.delete(key)
+
+def _attach(db: Session, model, data: Dict[str, Any]):
+    obj = model(**data)
+    make_transient_to_detached(obj)
+    return db.merge(obj, load=False)
+
+def get(db: Session, model, row_id: int, load: Callable[[], Any]):
+    """Return the row with ``row_id``, calling ``load`` only on a cache miss."""
+    if not config.CACHE_ENABLED:
+        return load()
+    key = _key(model, row_id)
+    entity = model.__tablename__
+    data = local.get(key)
+    if data is not None:
+        hits.inc(entity=entity, tier="local")
+        return _attach(db, model, data)
+    generation = _generations[_stripe(key)]
+    if shared is not None:
+        raw = shared.get(key)
+        if raw:
+            hits.inc(entity=entity, tier="shared")
+            data = _loads(model, raw)
+            _set_local(key, data, generation)
+            return _attach(db, model, data)
+    misses.inc(entity=entity)
+    obj = load()
+    # Not stored if a write invalidated the key while it loaded: obj may predate it
+    if obj is not None and _generations[_stripe(key)] == generation:
+        data = _row_dict(obj)
+        _set_local(key, data, generation)
+        if shared is not None:
+            shared.set(key, _dumps(data), config.CACHE_TTL_SECONDS, only_if_absent=True)
+    return obj
+
+def invalidate(model, *row_ids: int):
+    if not config.CACHE_ENABLED:
+        return
+    for row_id in row_ids:
+        key = _key(model, row_id)
+        with _generations_lock:
+            _generations[_stripe(key)] += 1
+        local.delete(key)
+        if shared is not None:
+            shared.set(key, INVALIDATED, config.CACHE_INVALIDATION_HOLD_SECONDS)
@@ -1,83 +1,221 @@
-from typing import Optional, List
-from sqlalchemy.orm import Session
-from datetime import datetime
+import csv
+import io
+from enum import Enum
+from typing import Optional, List, Dict, Iterable, Iterator, Sequence, Set, Tuple
+from sqlalchemy import select, insert, update, delete, exists, literal, func, text, case, and_, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, load_only
+from datetime import datetime, timedelta
 import models
 import schemas
+import analytics
+import cache
+import events
+import sync
+from pagination import keyset, encode_cursor
+from includes import loader_options
+
+ID_ORDERING = ("id",)
+TASK_ORDERINGS = {"id": ID_ORDERING, "deadline": ("deadline", "id")}
+COMMENT_ORDERINGS = {"id": ID_ORDERING, "created_at": ("created_at", "id")}
+
+def _existing_ids(db: Session, model, ids: Iterable[int]) -> Set[int]:
+    ids = set(ids)
+    if not ids:
+        return set()
+    return set(db.scalars(select(model.id).where(model.id.in_(ids))))
+
+def _upsert_insert(db: Session, model):
+    """Dialect INSERT construct, which supports ON CONFLICT clauses."""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+def _only_columns(query, model, fields: Sequence[str], keys: Sequence[str]):
+    """Sparse fieldset: SELECT only ``fields`` plus the sort keys the next cursor is built
+    from and the version the page's ETag is built from."""
+    if not fields:
+        return query
+    names = dict.fromkeys([*fields, *keys, "version"])
+    return query.options(load_only(*(getattr(model, name) for name in names)))
+
+def _update_returning(db: Session, model, row_id: int, values: dict):
+    """UPDATE ... RETURNING the whole row: one round trip, None if it doesn't exist."""
+    db_obj = db.scalars(
+        update(model).where(model.id == row_id).values(**values).returning(model)
+    ).first()
+    if db_obj is not None:
+        events.record(db, model, "updated", [db_obj])
+    db.commit()
+    cache.invalidate(model, row_id)
+    return db_obj
+
+# Foreign keys declared ON DELETE SET NULL, by parent model. Deletes clear them
+# first themselves: the rule would rewrite the rows without moving their
+# version and updated_at, and ETags would keep answering 304 for them.
+SET_NULL_REFERENCES = {
+    models.User: [(models.Comment, "user_id"), (models.ArchivedComment, "user_id")],
+    models.Team: [(models.Project, "team_id")],
+    models.Project: [(models.Task, "project_id"), (models.ArchivedTask, "project_id")],
+    models.Task: [(models.Comment, "task_id")],
+}
+
+def _clear_references(db: Session, model, ids: Iterable[int]) -> List[Tuple[type, List[int]]]:
+    """Null the references to the ``model`` rows about to be deleted; returns (model, ids) rewritten."""
+    ids = list(ids)
+    cleared = []
+    for child, column in SET_NULL_REFERENCES.get(model, ()):
+        table = child.__table__
+        child_ids = db.scalars(
+            update(table).where(table.c[column].in_(ids))
+            .values({column: None, "version": table.c.version + 1, "updated_at": func.now()})
+            .returning(table.c.id)
+        ).all()
+        cleared.append((child, child_ids))
+    return cleared
+
+def _delete_returning(db: Session, model, row_id: int) -> bool:
+    """DELETE ... RETURNING id, after clearing the SET NULL references to the row."""
+    cleared = _clear_references(db, model, [row_id])
+    deleted = db.execute(
+        delete(model).where(model.id == row_id).returning(*events.delete_columns(model))
+    ).mappings().first()
+    if deleted is not None:
+        events.record(db, model, "deleted", [deleted])
+    db.commit()
+    cache.invalidate(model, row_id)
+    for child, child_ids in cleared:
+        cache.invalidate(child, *child_ids)
+    return deleted is not None
+
+def _bulk_error(index: int, error: str, id: Optional[int] = None) -> schemas.BulkItemResult:
+    return schemas.BulkItemResult(index=index, id=id, status="error", error=error)
 
 # User CRUD operations
-def get_user(db: Session, user_id: int) -> Optional[models.User]:
-    return db.query(models.User).filter(models.User.id == user_id).first()
+def get_user(db: Session, user_id: int, include: Sequence[str] = ()) -> Optional[models.User]:
+    query = db.query(models.User).options(*loader_options(models.User, include))
+    query = query.filter(models.User.id == user_id)
+    if include:
+        return query.first()
+    return cache.get(db, models.User, user_id, query.first)
 
 def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.email == email).first()
 
-def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[models.User]:
-    return db.query(models.User).offset(skip).limit(limit).all()
+def get_users(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include: Sequence[str] = ()
+) -> List[models.User]:
+    query = db.query(models.User).options(*loader_options(models.User, include))
+    query = keyset(query, models.User.__table__, ID_ORDERING, cursor)
+    return query.offset(skip).limit(limit).all()
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
-    db_user = models.User(**user.dict())
-    db.add(db_user)
+def create_user(db: Session, user: schemas.UserCreate) -> Optional[models.User]:
+    """Insert the user in one statement; None if the email or username is taken."""
+    db_user = db.scalars(
+        _upsert_insert(db, models.User)
+        .values(**user.dict())
+        .on_conflict_do_nothing()
+        .returning(models.User)
+    ).first()
     db.commit()
-    db.refresh(db_user)
+    if db_user is not None:
+        cache.invalidate(models.User, db_user.id)
     return db_user
 
 def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate) -> Optional[models.User]:
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if db_user:
-        for key, value in user_update.dict().items():
-            if value is not None:
-                setattr(db_user, key, value)
-        db.commit()
-        db.refresh(db_user)
-    return db_user
+    values = {key: value for key, value in user_update.dict().items() if value is not None}
+    if not values:
+        return get_user(db, user_id)
+    return _update_returning(db, models.User, user_id, values)
 
 def delete_user(db: Session, user_id: int) -> bool:
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if db_user:
-        db.delete(db_user)
-        db.commit()
-        return True
-    return False
+    return _delete_returning(db, models.User, user_id)
 
 # Team CRUD operations
-def get_team(db: Session, team_id: int) -> Optional[models.Team]:
-    return db.query(models.Team).filter(models.Team.id == team_id).first()
+def get_team(db: Session, team_id: int, include: Sequence[str] = ()) -> Optional[models.Team]:
+    query = db.query(models.Team).options(*loader_options(models.Team, include))
+    query = query.filter(models.Team.id == team_id)
+    if include:
+        return query.first()
+    return cache.get(db, models.Team, team_id, query.first)
 
-def get_teams(db: Session, skip: int = 0, limit: int = 100) -> List[models.Team]:
-    return db.query(models.Team).offset(skip).limit(limit).all()
+def get_teams(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include: Sequence[str] = ()
+) -> List[models.Team]:
+    query = db.query(models.Team).options(*loader_options(models.Team, include))
+    query = keyset(query, models.Team.__table__, ID_ORDERING, cursor)
+    return query.offset(skip).limit(limit).all()
 
 def create_team(db: Session, team: schemas.TeamBase) -> models.Team:
     db_team = models.Team(**team.dict())
     db.add(db_team)
     db.commit()
     db.refresh(db_team)
+    cache.invalidate(models.Team, db_team.id)
     return db_team
 
 def update_team(db: Session, team_id: int, team_update: schemas.TeamBase) -> Optional[models.Team]:
-    db_team = db.query(models.Team).filter(models.Team.id == team_id).first()
-    if db_team:
-        for key, value in team_update.dict().items():
-            setattr(db_team, key, value)
-        db.commit()
-        db.refresh(db_team)
-    return db_team
+    return _update_returning(db, models.Team, team_id, team_update.dict())
 
 def delete_team(db: Session, team_id: int) -> bool:
-    db_team = db.query(models.Team).filter(models.Team.id == team_id).first()
-    if db_team:
-        db.delete(db_team)
-        db.commit()
-        return True
-    return False
+    return _delete_returning(db, models.Team, team_id)
+
+# Team membership operations. These work on user_team directly instead of
+# loading Team.members, so their cost doesn't grow with the team size.
+def add_team_members(db: Session, team_id: int, user_ids: List[int]) -> Set[int]:
+    """Add existing users to an existing team; returns the ids actually added."""
+    team_exists = exists().where(models.Team.id == team_id)
+    stmt = (
+        _upsert_insert(db, models.user_team)
+        .from_select(
+            ["user_id", "team_id"],
+            select(models.User.id, literal(team_id)).where(models.User.id.in_(user_ids), team_exists)
+        )
+        .on_conflict_do_nothing()
+        .returning(models.user_team.c.user_id)
+    )
+    added = set(db.scalars(stmt))
+    db.commit()
+    return added
+
+def remove_team_members(db: Session, team_id: int, user_ids: List[int]) -> Set[int]:
+    """Remove users from a team; returns the ids that were members."""
+    removed = set(db.scalars(
+        delete(models.user_team)
+        .where(models.user_team.c.team_id == team_id, models.user_team.c.user_id.in_(user_ids))
+        .returning(models.user_team.c.user_id)
+    ))
+    db.commit()
+    return removed
 
 # Project CRUD operations
-def get_project(db: Session, project_id: int) -> Optional[models.Project]:
-    return db.query(models.Project).filter(models.Project.id == project_id).first()
+def get_project(db: Session, project_id: int, include: Sequence[str] = ()) -> Optional[models.Project]:
+    query = db.query(models.Project).options(*loader_options(models.Project, include))
+    query = query.filter(models.Project.id == project_id)
+    if include:
+        return query.first()
+    return cache.get(db, models.Project, project_id, query.first)
 
-def get_projects(db: Session, skip: int = 0, limit: int = 100, team_id: Optional[int] = None) -> List[models.Project]:
-    query = db.query(models.Project)
+def get_projects(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    team_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include: Sequence[str] = ()
+) -> List[models.Project]:
+    query = db.query(models.Project).options(*loader_options(models.Project, include))
     if team_id:
         query = query.filter(models.Project.team_id == team_id)
+    query = keyset(query, models.Project.__table__, ID_ORDERING, cursor)
     return query.offset(skip).limit(limit).all()
 
 def create_project(db: Session, project: schemas.ProjectBase) -> models.Project:
@@ -85,28 +223,43 @@ def create_project(db: Session, project: schemas.ProjectBase) -> models.Project:
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
+    cache.invalidate(models.Project, db_project.id)
     return db_project
 
 def update_project(db: Session, project_id: int, project_update: schemas.ProjectBase) -> Optional[models.Project]:
-    db_project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if db_project:
-        for key, value in project_update.dict().items():
-            setattr(db_project, key, value)
-        db.commit()
-        db.refresh(db_project)
-    return db_project
+    return _update_returning(db, models.Project, project_id, project_update.dict())
 
 def delete_project(db: Session, project_id: int) -> bool:
-    db_project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if db_project:
-        db.delete(db_project)
-        db.commit()
-        return True
-    return False
+    return _delete_returning(db, models.Project, project_id)
 
 # Task CRUD operations
-def get_task(db: Session, task_id: int) -> Optional[models.Task]:
-    return db.query(models.Task).filter(models.Task.id == task_id).first()
+def get_task(db: Session, task_id: int, include: Sequence[str] = ()) -> Optional[models.Task]:
+    query = db.query(models.Task).options(*loader_options(models.Task, include))
+    query = query.filter(models.Task.id == task_id)
+    if include:
+        return query.first()
+    return cache.get(db, models.Task, task_id, query.first)
+
+def _filter_tasks(query, project_id, status, priority, deadline_before, model=models.Task):
+    if project_id:
+        query = query.filter(model.project_id == project_id)
+    if status:
+        query = query.filter(model.status == status)
+    if priority:
+        query = query.filter(model.priority == priority)
+    if deadline_before:
+        query = query.filter(model.deadline <= deadline_before)
+    return query
+
+def _with_archived(queries, keys: Sequence[str], skip: int, limit: int) -> list:
+    """One page over live and archived rows. Each query is ordered by ``keys``
+    and reads at most skip + limit rows from its own indexes."""
+    rows = [row for query in queries for row in query.limit(skip + limit).all()]
+    # Same order as keyset(): NULLs last, then ascending
+    rows.sort(key=lambda row: tuple(
+        part for key in keys for part in (getattr(row, key) is None, getattr(row, key))
+    ))
+    return rows[skip:skip + limit]
 
 def get_tasks(
     db: Session,
@@ -115,73 +268,472 @@ def get_tasks(
     project_id: Optional[int] = None,
     status: Optional[str] = None,
     priority: Optional[str] = None,
-    deadline_before: Optional[datetime] = None
+    deadline_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+    include: Sequence[str] = (),
+    fields: Sequence[str] = (),
+    include_archived: bool = False
 ) -> List[models.Task]:
-    query = db.query(models.Task)
-    if project_id:
-        query = query.filter(models.Task.project_id == project_id)
-    if status:
-        query = query.filter(models.Task.status == status)
-    if priority:
-        query = query.filter(models.Task.priority == priority)
-    if deadline_before:
-        query = query.filter(models.Task.deadline <= deadline_before)
-    return query.offset(skip).limit(limit).all()
+    keys = TASK_ORDERINGS[order_by]
+    queries = []
+    for model in (models.Task, models.ArchivedTask) if include_archived else (models.Task,):
+        query = db.query(model).options(*loader_options(model, include))
+        query = _only_columns(query, model, fields, keys)
+        query = _filter_tasks(query, project_id, status, priority, deadline_before, model)
+        queries.append(keyset(query, model.__table__, keys, cursor))
+    if include_archived:
+        return _with_archived(queries, keys, skip, limit)
+    return queries[0].offset(skip).limit(limit).all()
+
+def get_user_tasks(
+    db: Session,
+    user_id: int,
+    limit: int = 100,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    deadline_before: Optional[datetime] = None,
+    include_done: bool = False,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+    include: Sequence[str] = (),
+    fields: Sequence[str] = ()
+) -> List[models.Task]:
+    """Tasks of every project of every team the user is on, in one join that
+    walks indexes only: user_team's (user_id, team_id) primary key, then
+    projects.team_id, then tasks' (project_id, status, priority)."""
+    query = (
+        db.query(models.Task)
+        .join(models.Project, models.Project.id == models.Task.project_id)
+        .join(models.user_team, models.user_team.c.team_id == models.Project.team_id)
+        .filter(models.user_team.c.user_id == user_id)
+        .options(*loader_options(models.Task, include))
+    )
+    query = _only_columns(query, models.Task, fields, TASK_ORDERINGS[order_by])
+    query = _filter_tasks(query, None, status, priority, deadline_before)
+    if not status and not include_done:
+        query = query.filter(models.Task.status.is_distinct_from("done"))
+    query = keyset(query, models.Task.__table__, TASK_ORDERINGS[order_by], cursor)
+    return query.limit(limit).all()
 
 def create_task(db: Session, task: schemas.TaskBase) -> models.Task:
     db_task = models.Task(**task.dict())
     db.add(db_task)
+    db.flush()
+    events.record(db, models.Task, "created", [db_task])
+    analytics.record_created(db, [db_task])
     db.commit()
     db.refresh(db_task)
+    cache.invalidate(models.Task, db_task.id)
     return db_task
 
+def _update_task_returning_status(db: Session, task_id: int, values: dict):
+    """UPDATE ... RETURNING the task and its status before the write, None if it doesn't exist."""
+    tasks = models.Task.__table__
+    stmt = update(models.Task).values(**values)
+    if db.get_bind().dialect.name == "postgresql":
+        # The FROM subquery locks the row and reads the old status in the same
+        # statement, so concurrent updates record consecutive transitions
+        old = select(tasks.c.id, tasks.c.status).where(tasks.c.id == task_id).with_for_update().subquery("old")
+        return db.execute(stmt.where(models.Task.id == old.c.id).returning(models.Task, old.c.status)).first()
+    # SQLite's RETURNING can't read FROM tables; it has a single writer and
+    # no network round trip, so a plain read first is enough
+    old_status = db.scalar(select(tasks.c.status).where(tasks.c.id == task_id))
+    db_task = db.scalars(stmt.where(models.Task.id == task_id).returning(models.Task)).first()
+    return None if db_task is None else (db_task, old_status)
+
 def update_task(db: Session, task_id: int, task_update: schemas.TaskBase) -> Optional[models.Task]:
-    db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if db_task:
-        for key, value in task_update.dict().items():
-            setattr(db_task, key, value)
-        db.commit()
-        db.refresh(db_task)
+    row = _update_task_returning_status(db, task_id, task_update.dict())
+    db_task = None
+    if row is not None:
+        db_task, old_status = row
+        events.record(db, models.Task, "updated", [db_task])
+        analytics.record_status_changes(db, [(db_task.id, db_task.project_id, old_status, db_task.status)])
+    db.commit()
+    cache.invalidate(models.Task, task_id)
     return db_task
 
 def delete_task(db: Session, task_id: int) -> bool:
-    db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if db_task:
-        db.delete(db_task)
+    return _delete_returning(db, models.Task, task_id)
+
+def _stream_batches(db: Session, stmt, batch_size: int) -> Iterator[List[dict]]:
+    # yield_per implies stream_results, i.e. a server-side cursor on PostgreSQL
+    result = db.execute(stmt.execution_options(yield_per=batch_size))
+    for partition in result.mappings().partitions():
+        yield [dict(row) for row in partition]
+
+def stream_project_tasks(db: Session, project_id: int, batch_size: int) -> Iterator[List[dict]]:
+    tasks = models.Task.__table__
+    stmt = select(tasks).where(tasks.c.project_id == project_id).order_by(tasks.c.id)
+    return _stream_batches(db, stmt, batch_size)
+
+def stream_deadlines(
+    db: Session, after: Optional[datetime], until: datetime, batch_size: int
+) -> Iterator[List[dict]]:
+    """Open tasks with a deadline in (after, until]: a range scan on ix_tasks_deadline_id."""
+    tasks = models.Task.__table__
+    stmt = (
+        select(tasks.c.id, tasks.c.deadline, tasks.c.project_id, tasks.c.title, tasks.c.status)
+        .where(tasks.c.deadline <= until, tasks.c.status.is_distinct_from("done"))
+        .order_by(tasks.c.deadline, tasks.c.id)
+    )
+    if after is not None:
+        stmt = stmt.where(tasks.c.deadline > after)
+    return _stream_batches(db, stmt, batch_size)
+
+def stream_project_comments(db: Session, project_id: int, batch_size: int) -> Iterator[List[dict]]:
+    comments, tasks = models.Comment.__table__, models.Task.__table__
+    stmt = (
+        select(comments)
+        .join(tasks, comments.c.task_id == tasks.c.id)
+        .where(tasks.c.project_id == project_id)
+        .order_by(comments.c.task_id, comments.c.id)
+    )
+    return _stream_batches(db, stmt, batch_size)
+
+# Project board. Column headers come from one GROUP BY over
+# (project_id, status, priority), which ix_tasks_project_status_priority covers;
+# the first page of every column comes from one UNION ALL of per-status LIMIT queries.
+def _board_counts(db: Session, project_id: int, now: datetime):
+    task = models.Task
+    overdue = func.sum(case((and_(task.deadline < now, task.status != schemas.StatusEnum.done.value), 1), else_=0))
+    return db.execute(
+        select(task.status, task.priority, func.count(), overdue)
+        .where(task.project_id == project_id)
+        .group_by(task.status, task.priority)
+    ).all()
+
+def _board_tasks(db: Session, project_id: int, statuses: List[str], limit: int, keys: Sequence[str]) -> Dict[str, list]:
+    tasks = models.Task.__table__
+    pages = [
+        keyset(
+            select(tasks).where(tasks.c.project_id == project_id, tasks.c.status == status),
+            tasks,
+            keys
+        ).limit(limit).subquery()
+        for status in statuses
+    ]
+    columns = {status: [] for status in statuses}
+    for row in db.execute(union_all(*(select(page) for page in pages))).mappings():
+        columns[row["status"]].append(row)
+    # UNION ALL doesn't promise to keep each part's order
+    for rows in columns.values():
+        rows.sort(key=lambda row: tuple((row[key] is None, row[key]) for key in keys))
+    return columns
+
+def get_board(db: Session, project_id: int, column_limit: int = 20, order_by: str = "id") -> schemas.Board:
+    keys = TASK_ORDERINGS[order_by]
+    columns = {
+        status.value: schemas.BoardColumn(
+            status=status,
+            priorities={priority.value: 0 for priority in schemas.PriorityEnum}
+        )
+        for status in schemas.StatusEnum
+    }
+    for status, priority, count, overdue in _board_counts(db, project_id, datetime.now()):
+        column = columns.get(status)
+        if column is None:
+            continue
+        column.count += count
+        column.overdue += overdue or 0
+        if priority in column.priorities:
+            column.priorities[priority] += count
+
+    non_empty = [status for status, column in columns.items() if column.count]
+    if column_limit > 0 and non_empty:
+        for status, rows in _board_tasks(db, project_id, non_empty, column_limit, keys).items():
+            column = columns[status]
+            column.tasks = [schemas.BoardTask.model_validate(row) for row in rows]
+            if column.count > len(rows):
+                column.next_cursor = encode_cursor(keys, [rows[-1][key] for key in keys])
+
+    return schemas.Board(
+        project_id=project_id,
+        total=sum(column.count for column in columns.values()),
+        overdue=sum(column.overdue for column in columns.values()),
+        columns=list(columns.values())
+    )
+
+# Task bulk operations. Items are keyed by their position in the request
+# and every batch is written in a single transaction.
+def create_tasks(db: Session, tasks: Dict[int, schemas.TaskBase]) -> List[schemas.BulkItemResult]:
+    projects = _existing_ids(db, models.Project, (t.project_id for t in tasks.values()))
+    results = [_bulk_error(i, "Project not found") for i, t in tasks.items() if t.project_id not in projects]
+    valid = [i for i, t in tasks.items() if t.project_id in projects]
+    if valid:
+        created = db.scalars(
+            insert(models.Task).returning(models.Task, sort_by_parameter_order=True),
+            [tasks[i].dict() for i in valid]
+        ).all()
+        events.record(db, models.Task, "created", created)
+        analytics.record_created(db, created)
+        db.commit()
+        ids = [row.id for row in created]
+        cache.invalidate(models.Task, *ids)
+        results.extend(
+            schemas.BulkItemResult(index=i, id=task_id, status="created")
+            for i, task_id in zip(valid, ids)
+        )
+    return results
+
+def update_tasks(db: Session, tasks: Dict[int, schemas.TaskBulkUpdate]) -> List[schemas.BulkItemResult]:
+    existing = _existing_ids(db, models.Task, (t.id for t in tasks.values()))
+    projects = _existing_ids(db, models.Project, (t.project_id for t in tasks.values()))
+    results, rows = [], []
+    for i, task in tasks.items():
+        if task.id not in existing:
+            results.append(_bulk_error(i, "Task not found", task.id))
+        elif task.project_id not in projects:
+            results.append(_bulk_error(i, "Project not found", task.id))
+        else:
+            rows.append(task.dict())
+            results.append(schemas.BulkItemResult(index=i, id=task.id, status="updated"))
+    if rows:
+        old_statuses = dict(db.execute(
+            select(models.Task.id, models.Task.status)
+            .where(models.Task.id.in_([row["id"] for row in rows]))
+            .with_for_update()
+        ).all())
+        db.execute(update(models.Task), rows)
+        events.record_ids(db, models.Task, "updated", (row["id"] for row in rows))
+        analytics.record_status_changes(
+            db, [(row["id"], row["project_id"], old_statuses.get(row["id"]), row["status"]) for row in rows]
+        )
         db.commit()
-        return True
-    return False
+        cache.invalidate(models.Task, *(row["id"] for row in rows))
+    return results
+
+def delete_tasks(db: Session, task_ids: List[int]) -> Set[int]:
+    cleared = _clear_references(db, models.Task, task_ids)
+    deleted_rows = db.execute(
+        delete(models.Task).where(models.Task.id.in_(task_ids))
+        .returning(*events.delete_columns(models.Task))
+    ).mappings().all()
+    events.record(db, models.Task, "deleted", deleted_rows)
+    db.commit()
+    deleted = {row["id"] for row in deleted_rows}
+    cache.invalidate(models.Task, *deleted)
+    for child, child_ids in cleared:
+        cache.invalidate(child, *child_ids)
+    return deleted
 
 # Comment CRUD operations
 def get_comment(db: Session, comment_id: int) -> Optional[models.Comment]:
     return db.query(models.Comment).filter(models.Comment.id == comment_id).first()
 
-def get_comments(db: Session, skip: int = 0, limit: int = 100, task_id: Optional[int] = None) -> List[models.Comment]:
-    query = db.query(models.Comment)
+def _filter_comments(query, task_id, model=models.Comment):
     if task_id:
-        query = query.filter(models.Comment.task_id == task_id)
-    return query.offset(skip).limit(limit).all()
+        query = query.filter(model.task_id == task_id)
+    return query
+
+def get_comments(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    task_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+    fields: Sequence[str] = (),
+    include_archived: bool = False
+) -> List[models.Comment]:
+    keys = COMMENT_ORDERINGS[order_by]
+    queries = []
+    for model in (models.Comment, models.ArchivedComment) if include_archived else (models.Comment,):
+        query = _only_columns(db.query(model), model, fields, keys)
+        query = _filter_comments(query, task_id, model)
+        queries.append(keyset(query, model.__table__, keys, cursor))
+    if include_archived:
+        return _with_archived(queries, keys, skip, limit)
+    return queries[0].offset(skip).limit(limit).all()
 
 def create_comment(db: Session, comment: schemas.CommentBase) -> models.Comment:
     db_comment = models.Comment(**comment.dict())
     db.add(db_comment)
+    db.flush()
+    events.record(db, models.Comment, "created", [db_comment])
     db.commit()
     db.refresh(db_comment)
     return db_comment
 
 def update_comment(db: Session, comment_id: int, comment_update: schemas.CommentBase) -> Optional[models.Comment]:
-    db_comment = db.query(models.Comment).filter(models.Comment.id == comment_id).first()
-    if db_comment:
-        for key, value in comment_update.dict().items():
-            setattr(db_comment, key, value)
-        db.commit()
-        db.refresh(db_comment)
-    return db_comment
+    return _update_returning(db, models.Comment, comment_id, comment_update.dict())
 
 def delete_comment(db: Session, comment_id: int) -> bool:
-    db_comment = db.query(models.Comment).filter(models.Comment.id == comment_id).first()
-    if db_comment:
-        db.delete(db_comment)
+    return _delete_returning(db, models.Comment, comment_id)
+
+# Comment bulk operations
+def _comment_parent_errors(db: Session, comments: Dict[int, schemas.CommentBase]) -> Dict[int, str]:
+    tasks = _existing_ids(db, models.Task, (c.task_id for c in comments.values()))
+    users = _existing_ids(db, models.User, (c.user_id for c in comments.values()))
+    errors = {}
+    for i, comment in comments.items():
+        if comment.task_id not in tasks:
+            errors[i] = "Task not found"
+        elif comment.user_id not in users:
+            errors[i] = "User not found"
+    return errors
+
+def create_comments(db: Session, comments: Dict[int, schemas.CommentBase]) -> List[schemas.BulkItemResult]:
+    errors = _comment_parent_errors(db, comments)
+    results = [_bulk_error(i, error) for i, error in errors.items()]
+    valid = [i for i in comments if i not in errors]
+    if valid:
+        created = insert_comments(db, [comments[i] for i in valid])
+        results.extend(
+            schemas.BulkItemResult(index=i, id=comment.id, status="created")
+            for i, comment in zip(valid, created)
+        )
+    return results
+
+def insert_comments(db: Session, comments: List[schemas.CommentBase]) -> List[models.Comment]:
+    """One multi-row INSERT ... RETURNING and one commit; rows come back in input order."""
+    created = db.scalars(
+        insert(models.Comment).returning(models.Comment, sort_by_parameter_order=True),
+        [comment.dict() for comment in comments]
+    ).all()
+    events.record(db, models.Comment, "created", created)
+    db.commit()
+    return created
+
+def update_comments(db: Session, comments: Dict[int, schemas.CommentBulkUpdate]) -> List[schemas.BulkItemResult]:
+    existing = _existing_ids(db, models.Comment, (c.id for c in comments.values()))
+    errors = _comment_parent_errors(db, comments)
+    results, rows = [], []
+    for i, comment in comments.items():
+        if comment.id not in existing:
+            results.append(_bulk_error(i, "Comment not found", comment.id))
+        elif i in errors:
+            results.append(_bulk_error(i, errors[i], comment.id))
+        else:
+            rows.append(comment.dict())
+            results.append(schemas.BulkItemResult(index=i, id=comment.id, status="updated"))
+    if rows:
+        db.execute(update(models.Comment), rows)
+        events.record_ids(db, models.Comment, "updated", (row["id"] for row in rows))
         db.commit()
-        return True
-    return False
\ No newline at end of file
+    return results
+
+def delete_comments(db: Session, comment_ids: List[int]) -> Set[int]:
+    deleted_rows = db.execute(
+        delete(models.Comment).where(models.Comment.id.in_(comment_ids))
+        .returning(*events.delete_columns(models.Comment))
+    ).mappings().all()
+    events.record(db, models.Comment, "deleted", deleted_rows)
+    db.commit()
+    return {row["id"] for row in deleted_rows}
+
+# Import operations, used by importer.py. Rows arrive validated and grouped
+# so every row in a call has the same columns. Rows that conflict with
+# existing ones are skipped; the returned set holds the keys actually written.
+def import_parent_errors(db: Session, parents: Dict[str, type], rows: Dict[int, dict]) -> Dict[int, str]:
+    """Map row number to an error for rows whose foreign keys point at missing rows."""
+    errors = {}
+    for column, model in parents.items():
+        found = _existing_ids(db, model, (row[column] for row in rows.values() if row.get(column) is not None))
+        for row_number, row in rows.items():
+            value = row.get(column)
+            if value is not None and value not in found and row_number not in errors:
+                errors[row_number] = f"{model.__name__} {value} not found"
+    return errors
+
+def insert_import_rows(db: Session, table, rows: List[dict], keys: Sequence[str]) -> Set[tuple]:
+    """INSERT ... ON CONFLICT DO NOTHING RETURNING the key columns, executed with
+    a parameter list so SQLAlchemy batches it into multi-row VALUES statements."""
+    stmt = (
+        _upsert_insert(db, table)
+        .on_conflict_do_nothing()
+        .returning(*(table.c[key] for key in keys))
+    )
+    return {tuple(row) for row in db.execute(stmt, rows)}
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+def copy_import_rows(db: Session, table, rows: List[dict], keys: Sequence[str]) -> Set[tuple]:
+    """PostgreSQL COPY into a temporary staging table, then INSERT ... SELECT
+    ... ON CONFLICT DO NOTHING into the real one. Requires psycopg2."""
+    columns = list(rows[0])
+    column_list = ", ".join(columns)
+    stage = f"import_stage_{table.name}"
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute(f"CREATE TEMP TABLE {stage} AS SELECT {column_list} FROM {table.name} WITH NO DATA")
+        cursor.copy_expert(f"COPY {stage} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+        cursor.execute(
+            f"INSERT INTO {table.name} ({column_list}) SELECT {column_list} FROM {stage} "
+            f"ON CONFLICT DO NOTHING RETURNING {', '.join(keys)}"
+        )
+        written = {tuple(row) for row in cursor.fetchall()}
+        cursor.execute(f"DROP TABLE {stage}")
+    finally:
+        cursor.close()
+    return written
+
+def reset_id_sequence(db: Session, table):
+    """Move the id sequence past rows imported with explicit ids (PostgreSQL only)."""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), (SELECT max(id) FROM {table.name}))"
+    ))
+    db.commit()
+
+# Archiving
+def _archived_columns(live, archive) -> list:
+    """The live table's columns that its archive table keeps."""
+    return [live.c[name] for name in archive.c.keys() if name in live.c]
+
+def _database_time_ago(db: Session, age: timedelta):
+    """``age`` before the database clock, in the zone ``func.now()`` stores naive timestamps in:
+    the session's on PostgreSQL, UTC on SQLite."""
+    if db.get_bind().dialect.name == "sqlite":
+        return func.datetime("now", f"-{age.total_seconds()} seconds")
+    return func.localtimestamp() - age
+
+def archive_done_tasks(db: Session, older_than: timedelta, batch_size: int) -> Tuple[int, int]:
+    """Move up to ``batch_size`` tasks done and unchanged for ``older_than``, with their comments,
+    to the archive tables in one transaction; returns (tasks, comments) moved.
+
+    The rows are locked (SKIP LOCKED, so a concurrent edit just waits for the
+    next batch) and moved with DELETE ... RETURNING, so a row is archived
+    exactly as it was deleted. The deletes leave no sync tombstones: the rows
+    still exist, in the archive.
+    """
+    tasks, comments = models.Task.__table__, models.Comment.__table__
+    task_ids = db.scalars(
+        select(tasks.c.id)
+        .where(tasks.c.status == "done", tasks.c.updated_at <= _database_time_ago(db, older_than))
+        .order_by(tasks.c.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not task_ids:
+        db.rollback()
+        return 0, 0
+    with sync.without_tombstones(db):
+        moved_comments = db.execute(
+            delete(comments).where(comments.c.task_id.in_(task_ids))
+            .returning(*_archived_columns(comments, models.ArchivedComment.__table__))
+        ).mappings().all()
+        moved_tasks = db.execute(
+            delete(tasks).where(tasks.c.id.in_(task_ids))
+            .returning(*_archived_columns(tasks, models.ArchivedTask.__table__))
+        ).mappings().all()
+    db.execute(insert(models.ArchivedTask), [dict(row) for row in moved_tasks])
+    if moved_comments:
+        db.execute(insert(models.ArchivedComment), [dict(row) for row in moved_comments])
+    events.record(db, models.Task, "archived", moved_tasks)
+    db.commit()
+    cache.invalidate(models.Task, *task_ids)
+    cache.invalidate(models.Comment, *(row["id"] for row in moved_comments))
+    return len(moved_tasks), len(moved_comments)
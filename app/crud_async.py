@@ -0,0 +1,55 @@
+"""Async counterparts of the crud.py functions.
+
+Each function runs its crud.py twin through ``AsyncSession.run_sync``: the
+queries go over asyncpg on the event loop instead of tying up a threadpool
+worker, and the sync and async code paths share one implementation.
+"""
+from functools import wraps
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud
+import includes
+
+def _run_sync(fn):
+    @wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(fn, *args, **kwargs)
+    return wrapper
+
+# User CRUD operations
+get_user = _run_sync(crud.get_user)
+get_user_by_email = _run_sync(crud.get_user_by_email)
+get_users = _run_sync(crud.get_users)
+create_user = _run_sync(crud.create_user)
+update_user = _run_sync(crud.update_user)
+delete_user = _run_sync(crud.delete_user)
+
+# Team CRUD operations
+get_team = _run_sync(crud.get_team)
+get_teams = _run_sync(crud.get_teams)
+create_team = _run_sync(crud.create_team)
+update_team = _run_sync(crud.update_team)
+delete_team = _run_sync(crud.delete_team)
+
+# Project CRUD operations
+get_project = _run_sync(crud.get_project)
+get_projects = _run_sync(crud.get_projects)
+create_project = _run_sync(crud.create_project)
+update_project = _run_sync(crud.update_project)
+delete_project = _run_sync(crud.delete_project)
+
+# Task CRUD operations
+get_task = _run_sync(crud.get_task)
+get_tasks = _run_sync(crud.get_tasks)
+create_task = _run_sync(crud.create_task)
+update_task = _run_sync(crud.update_task)
+delete_task = _run_sync(crud.delete_task)
+
+# Comment CRUD operations
+get_comment = _run_sync(crud.get_comment)
+get_comments = _run_sync(crud.get_comments)
+create_comment = _run_sync(crud.create_comment)
+update_comment = _run_sync(crud.update_comment)
+delete_comment = _run_sync(crud.delete_comment)
+
+# ?include= serialization, which counts comments of the included tasks
+serialize = _run_sync(includes.serialize)
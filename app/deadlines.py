@@ -0,0 +1,366 @@
+"""Deadline reminders (``task.due_soon``) and overdue notices (``task.overdue``).
+
+The scheduler keeps a min-heap of timers, two per open task: a reminder
+DEADLINE_REMINDER_MINUTES before the deadline and the overdue notice at it.
+Only deadlines up to DEADLINE_HORIZON_HOURS ahead are held. Every
+DEADLINE_RESCAN_MINUTES (and whenever half the window has passed) the
+whole window is read again with a range scan on ``ix_tasks_deadline_id``
+and extended, so no tick ever reads the whole table. The rescan finds
+deadlines written without an event (imports, or anything while
+EVENTS_ENABLED is off) and drops tasks that left the window the same way.
+
+Task changes arrive as the live events from events.py (they carry the
+whole row), so every create, update and delete reaches the heap in
+milliseconds, whichever worker made it. Entries are never removed from the
+heap: a popped timer whose deadline no longer matches the task's current one
+is just skipped (lazy deletion). Sent overdue notices are remembered until
+their deadline leaves the window, so a rescan doesn't announce them again.
+
+Notices go to the DEADLINE_SINKS (log, webhook, memory, stats). On PostgreSQL one
+worker runs the scheduler, elected with an advisory lock; the others retry
+in case it goes away. The leader checks it still holds the lock before
+every window load and stands down if its lock connection was lost. Notices are at least once: deadlines passed less than
+DEADLINE_CATCHUP_MINUTES before a restart are announced again.
+"""
+import asyncio
+import heapq
+import json
+import logging
+import urllib.request
+from collections import deque
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+import analytics
+import config
+import crud
+import events
+import metrics
+from database import SessionLocal
+
+logger = logging.getLogger("teamwork.deadlines")
+
+DUE_SOON = "task.due_soon"
+OVERDUE = "task.overdue"
+# pg_try_advisory_lock key that elects the scheduling worker
+LEADER_LOCK_KEY = 7_140_322
+
+notices_sent = metrics.Counter("deadline_notices_total", "Deadline notices sent, by type")
+
+class Notice(NamedTuple):
+    type: str
+    task_id: int
+    project_id: Optional[int]
+    title: str
+    deadline: datetime
+
+    def as_dict(self) -> dict:
+        return {**self._asdict(), "deadline": self.deadline.isoformat()}
+
+# Sinks get every batch of notices that came due together, off the event loop
+class LogSink:
+    def send(self, notices: List[Notice]):
+        for notice in notices:
+            logger.info("%s: task %d %r, deadline %s", notice.type, notice.task_id, notice.title, notice.deadline)
+
+class WebhookSink:
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, notices: List[Notice]):
+        body = json.dumps([notice.as_dict() for notice in notices]).encode()
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+class MemorySink:
+    """Keeps the latest notices, for tests."""
+
+    def __init__(self, size: int = 1000):
+        self.notices: "deque[Notice]" = deque(maxlen=size)
+
+    def send(self, notices: List[Notice]):
+        self.notices.extend(notices)
+
+class StatsSink:
+    """Counts overdue notices into the daily rollups (see analytics.py)."""
+
+    def send(self, notices: List[Notice]):
+        misses = [(notice.task_id, notice.project_id, notice.deadline) for notice in notices if notice.type == OVERDUE]
+        if not misses:
+            return
+        db = SessionLocal()
+        try:
+            analytics.record_overdue(db, misses)
+            db.commit()
+        finally:
+            db.close()
+
+def build_sinks(names: List[str]) -> list:
+    sinks = []
+    for name in names:
+        if name == "log":
+            sinks.append(LogSink())
+        elif name == "webhook":
+            if not config.DEADLINE_WEBHOOK_URL:
+                raise ValueError("DEADLINE_SINKS includes webhook but DEADLINE_WEBHOOK_URL is not set")
+            sinks.append(WebhookSink(config.DEADLINE_WEBHOOK_URL))
+        elif name == "memory":
+            sinks.append(MemorySink())
+        elif name == "stats":
+            sinks.append(StatsSink())
+        else:
+            raise ValueError(f"Unknown deadline sink: {name}")
+    return sinks
+
+class _Tracked(NamedTuple):
+    deadline: datetime
+    project_id: Optional[int]
+    title: str
+
+class DeadlineScheduler:
+    def __init__(self, sinks: list, reminder: timedelta, horizon: timedelta, catchup: timedelta, rescan: timedelta):
+        self.sinks = sinks
+        self.reminder = reminder
+        # The window must reach past the reminder lead, or reminders would fire late
+        self.horizon = max(horizon, 2 * reminder)
+        self.catchup = catchup
+        self.rescan = min(rescan, self.horizon / 2)
+        # (fires at, task id, notice type, deadline the timer was set for)
+        self._heap: List[Tuple[datetime, int, str, datetime]] = []
+        self._tasks: Dict[int, _Tracked] = {}
+        self._loaded_until: Optional[datetime] = None
+        self._next_load: Optional[datetime] = None
+        # Task id -> deadline its overdue notice was sent for
+        self._announced: Dict[int, datetime] = {}
+        # Tasks changed by events while a window load is running; the event wins
+        self._touched: Optional[Set[int]] = None
+        self._wakeup = asyncio.Event()
+
+    def timer_count(self) -> int:
+        return len(self._tasks)
+
+    # Incremental updates
+    def track(self, task_id: int, deadline: Optional[datetime], project_id: Optional[int], title: str, status: Optional[str]):
+        """Set, move or drop a task's timers after a change."""
+        if self._touched is not None:
+            self._touched.add(task_id)
+        if deadline is None or status == "done" or self._loaded_until is None or deadline > self._loaded_until:
+            # Outside the window: a later load picks it up
+            self._tasks.pop(task_id, None)
+            return
+        if self._announced.get(task_id) == deadline:
+            return
+        current = self._tasks.get(task_id)
+        self._tasks[task_id] = _Tracked(deadline, project_id, title)
+        if current is None or current.deadline != deadline:
+            self._push(task_id, deadline)
+
+    def forget(self, task_id: int):
+        if self._touched is not None:
+            self._touched.add(task_id)
+        self._tasks.pop(task_id, None)
+
+    def _push(self, task_id: int, deadline: datetime):
+        if deadline - self.reminder > datetime.now() - self.catchup:
+            heapq.heappush(self._heap, (deadline - self.reminder, task_id, DUE_SOON, deadline))
+        heapq.heappush(self._heap, (deadline, task_id, OVERDUE, deadline))
+        self._wakeup.set()
+
+    def _clear(self):
+        self._heap, self._tasks, self._loaded_until = [], {}, None
+        self._wakeup.set()
+
+    def on_event(self, event: events.Event):
+        if event.type == "reset":
+            # Changes may have been missed: rebuild the window from the database
+            self._clear()
+        elif event.type == "task.deleted":
+            self.forget(event.data["id"])
+        elif event.type in ("task.created", "task.updated") and "deadline" in event.data:
+            data = event.data
+            deadline = data["deadline"]
+            if isinstance(deadline, str):
+                deadline = datetime.fromisoformat(deadline)
+            self.track(data["id"], deadline, data.get("project_id"), data.get("title", ""), data.get("status"))
+
+    # Window loading
+    def _load_rows(self, after: Optional[datetime], until: datetime) -> List[dict]:
+        db = SessionLocal()
+        try:
+            rows = []
+            for batch in crud.stream_deadlines(db, after, until, config.DEADLINE_LOAD_BATCH_SIZE):
+                rows.extend(batch)
+            return rows
+        finally:
+            db.close()
+
+    async def _extend_window(self, now: datetime):
+        """Read the window from the database again and extend it to ``now + horizon``."""
+        previous = self._loaded_until
+        after = now - self.catchup
+        until = now + self.horizon
+        # Events from here on are applied against the new window
+        self._loaded_until, self._touched = until, set()
+        try:
+            rows = await asyncio.get_running_loop().run_in_executor(None, self._load_rows, after, until)
+        except Exception:
+            self._loaded_until, self._touched = previous, None
+            raise
+        touched, self._touched = self._touched, None
+        for row in rows:
+            if row["id"] not in touched:
+                self.track(row["id"], row["deadline"], row["project_id"], row["title"], row["status"])
+        # Deleted, done or moved out of the window without an event
+        found = {row["id"] for row in rows} | touched
+        for task_id in [task_id for task_id, tracked in self._tasks.items() if tracked.deadline > after]:
+            if task_id not in found:
+                del self._tasks[task_id]
+        self._announced = {task_id: deadline for task_id, deadline in self._announced.items() if deadline > after}
+        self._next_load = now + self.rescan
+        logger.debug("Loaded %d deadlines up to %s", len(rows), until)
+
+    # Firing
+    def _pop_due(self, now: datetime) -> List[Notice]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, task_id, kind, deadline = heapq.heappop(self._heap)
+            tracked = self._tasks.get(task_id)
+            if tracked is None or tracked.deadline != deadline:
+                continue  # stale: the task moved, finished or was deleted
+            due.append(Notice(kind, task_id, tracked.project_id, tracked.title, deadline))
+            if kind == OVERDUE:
+                del self._tasks[task_id]
+                self._announced[task_id] = deadline
+        return due
+
+    def _send(self, notices: List[Notice]):
+        for sink in self.sinks:
+            try:
+                sink.send(notices)
+            except Exception:
+                logger.exception("Deadline sink %s failed", type(sink).__name__)
+        for notice in notices:
+            notices_sent.inc(type=notice.type)
+
+    async def run(self, still_leading: Optional[Callable[[], bool]] = None):
+        """Fire timers until ``still_leading`` (checked before each window load) says otherwise."""
+        loop = asyncio.get_running_loop()
+        while True:
+            now = datetime.now()
+            if self._loaded_until is None or now >= self._next_load:
+                if still_leading is not None and not await loop.run_in_executor(None, still_leading):
+                    self._clear()
+                    return
+                try:
+                    await self._extend_window(now)
+                except Exception:
+                    logger.exception("Loading deadlines failed, retrying")
+                    await asyncio.sleep(config.DEADLINE_LEADER_RETRY_SECONDS)
+                    continue
+            due = self._pop_due(now)
+            if due:
+                loop.run_in_executor(None, self._send, due)
+
+            next_at = min(self._heap[0][0], self._next_load) if self._heap else self._next_load
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max((next_at - datetime.now()).total_seconds(), 0))
+            except asyncio.TimeoutError:
+                pass
+
+scheduler = DeadlineScheduler(
+    build_sinks(config.DEADLINE_SINKS),
+    timedelta(minutes=config.DEADLINE_REMINDER_MINUTES),
+    timedelta(hours=config.DEADLINE_HORIZON_HOURS),
+    timedelta(minutes=config.DEADLINE_CATCHUP_MINUTES),
+    timedelta(minutes=config.DEADLINE_RESCAN_MINUTES)
+)
+
+metrics.Gauge(
+    "deadline_timers",
+    "Tasks with pending deadline timers in this worker",
+    callback=lambda: [({}, scheduler.timer_count())]
+)
+
+# Leader election across workers
+_lock_connection = None
+
+def _try_lead(engine) -> bool:
+    """Take the advisory lock on a connection kept for the process lifetime."""
+    global _lock_connection
+    if engine.dialect.name != "postgresql":
+        return True
+    if _lock_connection is None:
+        connection = engine.raw_connection()
+        connection.detach()
+        connection.driver_connection.rollback()
+        connection.driver_connection.autocommit = True
+        _lock_connection = connection
+    try:
+        with _lock_connection.driver_connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (LEADER_LOCK_KEY,))
+            return cursor.fetchone()[0]
+    except Exception:
+        # A dead connection; the next attempt opens a new one
+        _drop_lock_connection()
+        raise
+
+def _drop_lock_connection():
+    global _lock_connection
+    try:
+        _lock_connection.close()
+    except Exception:
+        pass
+    _lock_connection = None
+
+def _still_leading(engine) -> bool:
+    """Whether the lock connection is alive and holds the lock; if not, it is closed."""
+    if engine.dialect.name != "postgresql":
+        return True
+    try:
+        with _lock_connection.driver_connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND classid = 0 "
+                "AND objid = %s AND objsubid = 1 AND granted AND pid = pg_backend_pid())",
+                (LEADER_LOCK_KEY,)
+            )
+            if cursor.fetchone()[0]:
+                return True
+    except Exception:
+        logger.exception("Deadline scheduler lock connection failed")
+    _drop_lock_connection()
+    return False
+
+async def _lead_and_run(engine):
+    loop = asyncio.get_running_loop()
+    if not config.EVENTS_ENABLED:
+        logger.warning("EVENTS_ENABLED is off: task changes reach the deadline scheduler only when its window is reloaded")
+    # Ignored until the scheduler loads a window, which only the leader does
+    events.broker.watch(scheduler.on_event)
+    while True:
+        try:
+            if await loop.run_in_executor(None, _try_lead, engine):
+                logger.info("Running the deadline scheduler in this worker")
+                await scheduler.run(partial(_still_leading, engine))
+                logger.warning("Lost the deadline scheduler lock, standing down")
+        except Exception:
+            logger.exception("Deadline scheduler election failed")
+        await asyncio.sleep(config.DEADLINE_LEADER_RETRY_SECONDS)
+
+_task: Optional[asyncio.Task] = None
+
+def start(engine):
+    """Start the scheduler (once elected) on the running event loop; call after ``events.start``."""
+    global _task
+    if config.DEADLINES_ENABLED:
+        _task = asyncio.get_running_loop().create_task(_lead_and_run(engine))
+
+async def stop():
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,345 @@
+"""Live task and comment events for ``/projects/{id}/events`` (SSE and WebSocket).
+
+Writes in crud.py ``record`` their changed rows on the session; the events
+go out only if the transaction commits. On PostgreSQL they are sent with
+``pg_notify`` inside the committing transaction, numbered from the
+``project_event_seq`` sequence so ids agree across workers, and every worker
+holds one LISTEN connection (a background thread) that feeds its in-process
+``Broker``. Without PostgreSQL (EVENTS_BACKEND=memory, tests, SQLite) the
+committing process numbers the events and hands them to its broker directly.
+
+The broker keeps the last EVENTS_REPLAY_SIZE events so a reconnecting
+client can resume after its last event id, and gives every subscriber a
+queue of EVENTS_QUEUE_SIZE. A subscriber that falls that far behind is
+dropped with an ``overflow`` message instead of buffering without bound; it
+reconnects and catches up from the replay buffer. When the buffer can't
+cover the gap the client gets a ``reset`` message and should refetch.
+
+Events of tasks outside any project (their project was deleted) still go
+to the broker's watchers, such as the deadline scheduler; no stream
+carries them.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import select
+import threading
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import Sequence, event, select as sql_select, text
+from sqlalchemy.orm import Session
+import config
+import metrics
+import models
+
+logger = logging.getLogger("teamwork.events")
+
+CHANNEL = "teamwork_events"
+# NOTIFY payloads must stay under 8000 bytes
+MAX_NOTIFY_BYTES = 7900
+
+ENTITIES = {models.Task: "task", models.Comment: "comment"}
+
+# Created with the tables by create_all; migrations/0005_events.sql for existing databases
+event_ids = Sequence("project_event_seq", metadata=models.Base.metadata)
+
+published = metrics.Counter("events_published_total", "Task and comment events delivered to this worker, by type")
+overflows = metrics.Counter("events_subscriber_overflows_total", "Subscribers dropped for falling behind")
+
+class Event(NamedTuple):
+    # None for control messages (reset, overflow), which don't move the client's position
+    id: Optional[int]
+    # None for tasks outside any project and their comments
+    project_id: Optional[int]
+    type: str
+    data: dict
+
+    def sse(self) -> str:
+        lines = [] if self.id is None else [f"id: {self.id}"]
+        lines += [f"event: {self.type}", f"data: {json.dumps(self.data, default=_json_default)}"]
+        return "\n".join(lines) + "\n\n"
+
+    def message(self) -> dict:
+        return {"id": self.id, "type": self.type, "data": self.data}
+
+def _json_default(value):
+    return value.isoformat()
+
+# Recording, called by crud.py before the write commits
+def _row_data(model, row) -> dict:
+    if hasattr(row, "keys"):
+        return dict(row)
+    return {column.key: getattr(row, column.key) for column in model.__table__.columns}
+
+def record(db: Session, model, action: str, rows: Iterable):
+    """Queue ``<entity>.<action>`` events for rows (ORM objects or mappings) written in this transaction."""
+    if not config.EVENTS_ENABLED or model not in ENTITIES:
+        return
+    pending = db.info.setdefault("pending_events", [])
+    pending.extend((f"{ENTITIES[model]}.{action}", _row_data(model, row)) for row in rows)
+
+def record_ids(db: Session, model, action: str, ids: Iterable[int]):
+    """Like ``record``, loading the rows first; for writes that don't return them."""
+    ids = list(ids)
+    if config.EVENTS_ENABLED and model in ENTITIES and ids:
+        record(db, model, action, db.scalars(sql_select(model).where(model.id.in_(ids))).all())
+
+def delete_columns(model) -> tuple:
+    """Columns a DELETE ... RETURNING needs for the event: the id and what locates the project."""
+    table = model.__table__
+    if model is models.Task:
+        return table.c.id, table.c.project_id
+    if model is models.Comment:
+        return table.c.id, table.c.task_id
+    return (table.c.id,)
+
+def _resolve_projects(db: Session, pending: List[Tuple[str, dict]]) -> List[Tuple[Optional[int], str, dict]]:
+    """Attach project ids; comments get theirs from their task in one query."""
+    task_ids = {data.get("task_id") for kind, data in pending if kind.startswith("comment.")} - {None}
+    task_projects = dict(db.execute(
+        sql_select(models.Task.id, models.Task.project_id).where(models.Task.id.in_(task_ids))
+    ).all()) if task_ids else {}
+    return [
+        (data.get("project_id") if kind.startswith("task.") else task_projects.get(data.get("task_id")), kind, data)
+        for kind, data in pending
+    ]
+
+def _payload(project_id: Optional[int], kind: str, data: dict) -> str:
+    payload = json.dumps({"project_id": project_id, "type": kind, "data": data}, default=_json_default)
+    if len(payload.encode()) > MAX_NOTIFY_BYTES:
+        # Too big for NOTIFY: send the keys only, subscribers refetch the row
+        keys = {key: data[key] for key in ("id", "project_id", "task_id") if key in data}
+        payload = json.dumps({"project_id": project_id, "type": kind, "data": {**keys, "truncated": True}})
+    return payload
+
+def _decode(event_id: int, payload: str) -> Event:
+    body = json.loads(payload)
+    return Event(event_id, body["project_id"], body["type"], body["data"])
+
+@event.listens_for(Session, "before_commit")
+def _send_pending(session: Session):
+    pending = session.info.pop("pending_events", None)
+    if not pending:
+        return
+    payloads = [_payload(*item) for item in _resolve_projects(session, pending)]
+    if broker.uses_notify:
+        # Delivered by PostgreSQL when, and only if, this transaction commits
+        session.execute(
+            text(
+                "SELECT pg_notify(:channel, nextval('project_event_seq') || ':' || payload) "
+                "FROM unnest(CAST(:payloads AS text[])) WITH ORDINALITY AS p(payload, n) ORDER BY n"
+            ),
+            {"channel": CHANNEL, "payloads": payloads}
+        )
+    else:
+        session.info["committed_events"] = payloads
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session):
+    payloads = session.info.pop("committed_events", None)
+    if payloads:
+        broker.publish_local(payloads)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop("pending_events", None)
+    session.info.pop("committed_events", None)
+
+# Fan-out inside one worker
+class Subscription:
+    def __init__(self, project_id: int, size: int):
+        self.project_id = project_id
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+class Broker:
+    """Per-process fan-out. Methods not marked thread-safe run on the event loop."""
+
+    def __init__(self, replay_size: int, queue_size: int):
+        self.queue_size = queue_size
+        self.uses_notify = False
+        self._recent: "deque[Event]" = deque(maxlen=replay_size)
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        # In-process consumers of every event, such as the deadline scheduler
+        self._watchers: List[Callable[[Event], None]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._local_ids = itertools.count(1)
+        self._id_lock = threading.Lock()
+
+    def start(self, loop: asyncio.AbstractEventLoop, uses_notify: bool):
+        self._loop = loop
+        self.uses_notify = uses_notify
+
+    def watch(self, callback: Callable[[Event], None]):
+        """Call ``callback`` with every event of every project, and with a
+        ``reset`` event when events may have been lost."""
+        self._watchers.append(callback)
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def subscribe(self, project_id: int, last_event_id: Optional[int]) -> Tuple[Subscription, Optional[List[Event]]]:
+        """Register a subscriber and return the events it missed, or None if they can't be replayed."""
+        subscription = Subscription(project_id, self.queue_size)
+        self._subscribers.setdefault(project_id, set()).add(subscription)
+        if last_event_id is None:
+            return subscription, []
+        if not self._recent or self._recent[0].id > last_event_id + 1:
+            # Events after last_event_id may have left the buffer (or this worker never saw them)
+            return subscription, None
+        return subscription, [e for e in self._recent if e.id > last_event_id and e.project_id == project_id]
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.project_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.project_id]
+
+    def _drop(self, subscription: Subscription):
+        subscription.overflowed = True
+        overflows.inc()
+        self.unsubscribe(subscription)
+
+    def dispatch(self, events: List[Event]):
+        for item in events:
+            self._recent.append(item)
+            published.inc(type=item.type)
+            for callback in self._watchers:
+                callback(item)
+            for subscription in list(self._subscribers.get(item.project_id, ())):
+                try:
+                    subscription.queue.put_nowait(item)
+                except asyncio.QueueFull:
+                    self._drop(subscription)
+
+    def lost_events(self):
+        """Called after notifications may have been missed: nothing buffered can be trusted."""
+        self._recent.clear()
+        for callback in self._watchers:
+            callback(Event(None, 0, "reset", {}))
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                self._drop(subscription)
+
+    def notifications_lost(self):
+        """Thread-safe ``lost_events``."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.lost_events)
+
+    def publish_local(self, payloads: List[str]):
+        """Number and deliver events committed by this process (no LISTEN/NOTIFY); thread-safe."""
+        if self._loop is None:
+            return
+        with self._id_lock:
+            events = [_decode(next(self._local_ids), payload) for payload in payloads]
+        self._loop.call_soon_threadsafe(self.dispatch, events)
+
+    def publish_notifications(self, notifications: List[Tuple[int, str]]):
+        """Deliver (event id, payload) pairs from the LISTEN thread; thread-safe."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.dispatch, [_decode(*n) for n in notifications])
+
+broker = Broker(config.EVENTS_REPLAY_SIZE, config.EVENTS_QUEUE_SIZE)
+
+metrics.Gauge(
+    "events_subscribers",
+    "Open event stream subscriptions in this worker",
+    callback=lambda: [({}, broker.subscriber_count())]
+)
+
+async def follow(project_id: int, last_event_id: Optional[int] = None) -> AsyncIterator[Optional[Event]]:
+    """A project's events: the missed ones after ``last_event_id``, then live.
+
+    Yields None after EVENTS_HEARTBEAT_SECONDS without events, so callers can
+    keep the connection alive, and ends with an ``overflow`` event if the
+    subscriber falls behind.
+    """
+    subscription, replay = broker.subscribe(project_id, last_event_id)
+    try:
+        # Registration and the replay snapshot happen in one step, so the
+        # queue only holds events newer than the replay
+        if replay is None:
+            yield Event(None, project_id, "reset", {})
+        else:
+            for item in replay:
+                yield item
+        while True:
+            if subscription.overflowed and subscription.queue.empty():
+                yield Event(None, project_id, "overflow", {})
+                return
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), config.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            yield item
+    finally:
+        broker.unsubscribe(subscription)
+
+# One LISTEN connection per worker
+class PostgresListener(threading.Thread):
+    def __init__(self, engine, target: Broker):
+        super().__init__(name="events-listener", daemon=True)
+        self.engine = engine
+        self.broker = target
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Event listener connection failed, reconnecting")
+                self.broker.notifications_lost()
+                self._stopping.wait(config.EVENTS_RECONNECT_SECONDS)
+
+    def _listen(self):
+        # Taken out of the pool for good: it sits in LISTEN for the worker's lifetime
+        connection = self.engine.raw_connection()
+        connection.detach()
+        try:
+            dbapi_connection = connection.driver_connection
+            # The pool's pre-ping may have left a transaction open
+            dbapi_connection.rollback()
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            logger.info("Listening for events on %s", CHANNEL)
+            while not self._stopping.is_set():
+                if select.select([dbapi_connection], [], [], 1.0) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                notifications = []
+                while dbapi_connection.notifies:
+                    notify = dbapi_connection.notifies.pop(0)
+                    event_id, payload = notify.payload.split(":", 1)
+                    notifications.append((int(event_id), payload))
+                if notifications:
+                    self.broker.publish_notifications(notifications)
+        finally:
+            connection.close()
+
+_listener: Optional[PostgresListener] = None
+
+def start(engine):
+    """Attach the broker to the running event loop and, on PostgreSQL, start this worker's listener."""
+    global _listener
+    backend = config.EVENTS_BACKEND
+    if backend == "auto":
+        backend = "postgres" if engine.dialect.name == "postgresql" else "memory"
+    if backend == "postgres" and engine.dialect.driver != "psycopg2":
+        logger.warning("LISTEN/NOTIFY events need psycopg2, using the in-process broker")
+        backend = "memory"
+    broker.start(asyncio.get_running_loop(), uses_notify=backend == "postgres")
+    if backend == "postgres" and config.EVENTS_ENABLED:
+        _listener = PostgresListener(engine, broker)
+        _listener.start()
+
+def stop():
+    if _listener is not None:
+        _listener.stop()
@@ -0,0 +1,113 @@
+"""Group commit for single-comment inserts (POST /comments/).
+
+With COMMENT_GROUP_COMMIT on, concurrent ``create_comment`` calls join an
+open batch instead of each committing on its own. The first caller in a
+batch waits up to COMMENT_GROUP_COMMIT_WINDOW_MS (or until the batch holds
+COMMENT_GROUP_COMMIT_MAX_ROWS) and then writes it with
+``crud.insert_comments``: one multi-row INSERT and one commit, so one WAL
+flush for the whole batch. The other callers block until it is written
+and each gets its own row back.
+
+If the batch fails on a constraint (say, a task deleted meanwhile), its rows
+are retried one by one so only the offending caller sees the error.
+"""
+import logging
+import threading
+from typing import Callable, List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import config
+import crud
+import metrics
+from database import SessionLocal
+
+logger = logging.getLogger("teamwork.group_commit")
+
+batch_rows = metrics.Histogram(
+    "comment_group_commit_rows",
+    "Rows written per group commit",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+batch_fallbacks = metrics.Counter(
+    "comment_group_commit_fallbacks_total",
+    "Group commits that failed and were retried row by row"
+)
+
+class _Batch:
+    def __init__(self):
+        self.items: list = []
+        self.results: list = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+class GroupCommitter:
+    """Collects items from many threads and writes them with ``write(db, items)`` in batches."""
+
+    def __init__(self, write: Callable[[Session, list], list], window_seconds: float, max_rows: int):
+        self.write = write
+        self.window_seconds = window_seconds
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._open: Optional[_Batch] = None
+
+    def submit(self, item):
+        """Add ``item`` to the open batch and return its written row once the batch commits."""
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            index = len(batch.items)
+            batch.items.append(item)
+            if len(batch.items) >= self.max_rows:
+                self._open = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window_seconds)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self._flush(batch)
+        else:
+            batch.done.wait()
+
+        result = batch.results[index]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _flush(self, batch: _Batch):
+        batch_rows.observe(len(batch.items))
+        db = SessionLocal()
+        try:
+            try:
+                batch.results = list(self.write(db, batch.items))
+            except IntegrityError:
+                db.rollback()
+                batch_fallbacks.inc()
+                batch.results = self._write_each(db, batch.items)
+        except Exception as exc:
+            logger.exception("Group commit of %d rows failed", len(batch.items))
+            batch.results = [exc] * len(batch.items)
+        finally:
+            db.close()
+            batch.done.set()
+
+    def _write_each(self, db: Session, items: list) -> List:
+        results = []
+        for item in items:
+            try:
+                results.extend(self.write(db, [item]))
+                # Keep written rows out of reach of a later rollback, which would expire them
+                db.expunge_all()
+            except IntegrityError as exc:
+                db.rollback()
+                results.append(exc)
+        return results
+
+comments = GroupCommitter(
+    crud.insert_comments,
+    config.COMMENT_GROUP_COMMIT_WINDOW_MS / 1000,
+    config.COMMENT_GROUP_COMMIT_MAX_ROWS
+)
@@ -0,0 +1,63 @@
+"""Weak ETags, Last-Modified and 304 answers for polled read endpoints.
+
+A single row's validator is its ``version``. A list page's is the query
+string plus the id and version of every row on it, taken from the page the
+handler loads anyway. No extra query runs, and a 304 still skips
+serializing and sending the body. Lists carry no Last-Modified: the newest
+``updated_at`` can't tell that a row left the page. Responses with
+``?include=`` also depend on related rows and are always sent in full.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+from fastapi import Request, Response, status
+
+def entity_etag(obj) -> str:
+    return f'W/"{obj.__tablename__}-{obj.id}-{obj.version}"'
+
+def page_etag(request: Request, rows: Iterable) -> str:
+    state = f"{request.url.path}?{request.url.query}|" + ",".join(f"{row.id}:{row.version}" for row in rows)
+    return f'W/"{hashlib.sha1(state.encode()).hexdigest()}"'
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def _http_date(value: datetime) -> str:
+    # Timestamps are stored naive, in UTC
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def _modified_since(request: Request, last_modified: datetime) -> bool:
+    header = request.headers.get("if-modified-since")
+    if not header:
+        return True
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return True
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) > since
+
+def not_modified(request: Request, response: Response, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Set the validators on ``response``; True if the client's copy is still current.
+
+    Weak comparison is used for If-None-Match, which takes precedence over
+    If-Modified-Since.
+    """
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = _http_date(last_modified)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [_opaque(tag) for tag in if_none_match.split(",")]
+        return "*" in tags or _opaque(etag) in tags
+    if last_modified is not None:
+        return not _modified_since(request, last_modified)
+    return False
+
+def not_modified_response(response: Response) -> Response:
+    headers = {
+        name: value for name, value in response.headers.items()
+        if name in ("etag", "last-modified")
+    }
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -0,0 +1,78 @@
+"""Bulk-load data files through the import pipeline in importer.py.
+
+    python import_data.py docs/demo/seed_data      # run from the app/ directory
+    python import_data.py tasks.csv --entity tasks
+
+A directory is scanned for files named after the entities (``users.json``,
+``user_team.csv``, ``tasks.ndjson``, ...), which are imported parents first.
+A single file takes its entity from ``--entity`` or its name. Progress goes
+to stdout after every batch, row errors to stderr.
+"""
+import argparse
+import os
+import sys
+from typing import List, Tuple
+import config
+import models
+import importer
+import search  # registers the full-text search DDL with create_all
+from database import engine
+
+CHUNK_SIZE = 1024 * 1024
+
+def entity_for(path: str) -> importer.ImportEntity:
+    return importer.ImportEntity(os.path.splitext(os.path.basename(path))[0])
+
+def format_for(path: str) -> importer.ImportFormat:
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    return importer.ImportFormat("ndjson" if extension == "jsonl" else extension)
+
+def files_in(directory: str) -> List[Tuple[importer.ImportEntity, str]]:
+    found = {}
+    for name in os.listdir(directory):
+        try:
+            entity, path = entity_for(name), os.path.join(directory, name)
+            format_for(path)
+        except ValueError:
+            continue
+        if os.path.getsize(path):
+            found[entity] = path
+    return [(entity, found[entity]) for entity in importer.IMPORT_ORDER if entity in found]
+
+def read_chunks(path: str):
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+def print_progress(report):
+    print(
+        f"{report.entity}: {report.processed} rows, {report.inserted} inserted, "
+        f"{report.skipped} skipped, {report.failed} failed",
+        flush=True
+    )
+
+def import_file(entity: importer.ImportEntity, path: str) -> bool:
+    print(f"Importing {path} as {entity.value}...")
+    report = importer.run_import(entity, format_for(path), read_chunks(path), print_progress)
+    for error in report.errors:
+        print(f"  {os.path.basename(path)} row {error.row}: {error.error}", file=sys.stderr)
+    if len(report.errors) >= config.IMPORT_MAX_ERRORS:
+        print(f"  (only the first {config.IMPORT_MAX_ERRORS} errors are listed)", file=sys.stderr)
+    return report.failed == 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="data file, or a directory of files named after the entities")
+    parser.add_argument("--entity", choices=[entity.value for entity in importer.ImportEntity])
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    if os.path.isdir(args.path):
+        jobs = files_in(args.path)
+    else:
+        jobs = [(importer.ImportEntity(args.entity) if args.entity else entity_for(args.path), args.path)]
+    results = [import_file(entity, path) for entity, path in jobs]
+    return 0 if all(results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""Bulk import of users, teams, memberships, projects, tasks and comments.
+
+Records are streamed out of JSON (an array), NDJSON or CSV input and
+validated in batches of IMPORT_BATCH_SIZE against the ``*Import`` schemas.
+Each batch is checked for missing parent rows with one IN query per foreign
+key and written in one statement: COPY through a staging table on
+PostgreSQL (psycopg2), a multi-row INSERT elsewhere. Every batch commits on
+its own, so a failed row never rolls back its neighbours and progress is
+reported as batches land. Entities depend on each other, so a full load
+runs them in IMPORT_ORDER.
+
+Used by ``POST /import`` and by ``import_data.py`` on the command line.
+"""
+import codecs
+import csv
+import json
+import logging
+from enum import Enum
+from itertools import groupby, islice
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+import config
+import crud
+import metrics
+import models
+import moderation
+import schemas
+from database import SessionLocal
+
+logger = logging.getLogger("teamwork.import")
+
+rows_imported = metrics.Counter("import_rows_total", "Imported rows by entity and result")
+
+class ImportFormat(str, Enum):
+    json = "json"
+    ndjson = "ndjson"
+    csv = "csv"
+
+class ImportEntity(str, Enum):
+    users = "users"
+    teams = "teams"
+    user_team = "user_team"
+    projects = "projects"
+    tasks = "tasks"
+    comments = "comments"
+
+class EntitySpec(NamedTuple):
+    table: object
+    schema: type
+    # Columns returned by the INSERT, used to tell written rows from skipped ones
+    keys: Tuple[str, ...]
+    # Foreign key column -> parent model
+    parents: Dict[str, type]
+    # Field checked by comment moderation
+    moderated: Optional[str] = None
+
+ENTITIES = {
+    ImportEntity.users: EntitySpec(models.User.__table__, schemas.UserImport, ("username",), {}),
+    ImportEntity.teams: EntitySpec(models.Team.__table__, schemas.TeamImport, ("id",), {}),
+    ImportEntity.user_team: EntitySpec(
+        models.user_team, schemas.MembershipImport, ("user_id", "team_id"),
+        {"user_id": models.User, "team_id": models.Team}
+    ),
+    ImportEntity.projects: EntitySpec(
+        models.Project.__table__, schemas.ProjectImport, ("id",), {"team_id": models.Team}
+    ),
+    ImportEntity.tasks: EntitySpec(
+        models.Task.__table__, schemas.TaskImport, ("id",), {"project_id": models.Project}
+    ),
+    ImportEntity.comments: EntitySpec(
+        models.Comment.__table__, schemas.CommentImport, ("id",),
+        {"task_id": models.Task, "user_id": models.User}, "text"
+    ),
+}
+
+# Parents before children
+IMPORT_ORDER = tuple(ENTITIES)
+
+CONTENT_TYPES = {
+    "application/json": ImportFormat.json,
+    "application/x-ndjson": ImportFormat.ndjson,
+    "application/jsonl": ImportFormat.ndjson,
+    "text/csv": ImportFormat.csv,
+}
+
+class ImportFormatError(ValueError):
+    pass
+
+class _Malformed(NamedTuple):
+    error: str
+
+def format_for_content_type(content_type: Optional[str]) -> ImportFormat:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type not in CONTENT_TYPES:
+        raise ImportFormatError(
+            f"Unsupported content type {media_type or 'none'}; pass ?format= or one of: {', '.join(CONTENT_TYPES)}"
+        )
+    return CONTENT_TYPES[media_type]
+
+def decode(chunks: Iterable[bytes]) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def _lines(chunks: Iterable[str]) -> Iterator[str]:
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        end = buffer.rfind("\n")
+        if end == -1:
+            continue
+        yield from buffer[:end + 1].splitlines(keepends=True)
+        buffer = buffer[end + 1:]
+    if buffer:
+        yield buffer
+
+def _read_ndjson(chunks: Iterable[str]) -> Iterator:
+    for line in _lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield _Malformed(f"Malformed JSON: {exc}")
+
+def _read_csv(chunks: Iterable[str]) -> Iterator[dict]:
+    for record in csv.DictReader(_lines(chunks)):
+        # Empty cells mean "not set", so defaults and NULLs apply
+        yield {key: value for key, value in record.items() if key is not None and value not in ("", None)}
+
+def _read_json_array(chunks: Iterable[str]) -> Iterator:
+    """Yield the elements of a top-level JSON array as they are received.
+
+    A structural error ends the stream with a ``_Malformed`` record, so the
+    rows read so far are still imported and the error lands in the report.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer, pos = "", 0
+
+    def read_more() -> bool:
+        nonlocal buffer, pos
+        more = next(chunks, None)
+        if more is None:
+            return False
+        # Drop what has been consumed; slicing per record would be quadratic
+        buffer, pos = buffer[pos:] + more, 0
+        return True
+
+    def peek() -> Optional[str]:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not read_more():
+                return None
+
+    if peek() != "[":
+        yield _Malformed("Expected a JSON array of records")
+        return
+    pos += 1
+    if peek() == "]":
+        return
+    while True:
+        if peek() is None:
+            yield _Malformed("Unexpected end of JSON input")
+            return
+        while True:
+            try:
+                value, pos = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError as exc:
+                if not read_more():
+                    yield _Malformed(f"Malformed JSON: {exc}")
+                    return
+        yield value
+        separator = peek()
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            yield _Malformed("Malformed JSON: expected ',' or ']' after a record")
+            return
+
+READERS = {
+    ImportFormat.json: _read_json_array,
+    ImportFormat.ndjson: _read_ndjson,
+    ImportFormat.csv: _read_csv,
+}
+
+def read_records(chunks: Iterable[str], import_format: ImportFormat) -> Iterator[Tuple[int, object]]:
+    """(1-based row number, raw record) pairs."""
+    return enumerate(READERS[import_format](chunks), start=1)
+
+def _validate(spec: EntitySpec, batch: List[Tuple[int, object]]):
+    valid: Dict[int, dict] = {}
+    errors: Dict[int, str] = {}
+    for row_number, record in batch:
+        if isinstance(record, _Malformed):
+            errors[row_number] = record.error
+            continue
+        try:
+            valid[row_number] = spec.schema.model_validate(record).model_dump(exclude_none=True)
+        except ValidationError as exc:
+            errors[row_number] = "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc']) or 'row'}: {err['msg']}" for err in exc.errors()
+            )
+    if spec.moderated and valid:
+        reasons = moderation.check_many([row[spec.moderated] for row in valid.values()])
+        for row_number, reason in zip(list(valid), reasons):
+            if reason is not None:
+                del valid[row_number]
+                errors[row_number] = f"{spec.moderated}: {moderation.REJECTED_MESSAGE}"
+    return valid, errors
+
+def _use_copy(db: Session) -> bool:
+    dialect = db.get_bind().dialect
+    return config.IMPORT_USE_COPY and dialect.name == "postgresql" and dialect.driver == "psycopg2"
+
+def _write(db: Session, spec: EntitySpec, rows: Dict[int, dict]) -> Tuple[int, Dict[int, str]]:
+    """Insert the rows, grouped by column set.
+
+    Returns the number of rows written and errors for rows that repeat a key
+    earlier in the batch or that already existed.
+    """
+    write = crud.copy_import_rows if _use_copy(db) else crud.insert_import_rows
+    written_count, errors, seen = 0, {}, {}
+    for row_number, row in rows.items():
+        if all(key in row for key in spec.keys):
+            key = tuple(row[key] for key in spec.keys)
+            if key in seen:
+                errors[row_number] = f"Duplicate of row {seen[key]}"
+            else:
+                seen[key] = row_number
+
+    pending = sorted((item for item in rows.items() if item[0] not in errors), key=lambda item: tuple(item[1]))
+    for _, group in groupby(pending, key=lambda item: tuple(item[1])):
+        group = list(group)
+        written = write(db, spec.table, [row for _, row in group], spec.keys)
+        written_count += len(written)
+        for row_number, row in group:
+            if all(key in row for key in spec.keys) and tuple(row[key] for key in spec.keys) not in written:
+                errors[row_number] = "Already exists"
+    return written_count, errors
+
+def _record_errors(report: schemas.ImportReport, errors: Dict[int, str]):
+    for row_number in sorted(errors):
+        if len(report.errors) >= config.IMPORT_MAX_ERRORS:
+            break
+        report.errors.append(schemas.ImportRowError(row=row_number, error=errors[row_number]))
+
+def import_records(
+    db: Session,
+    entity: ImportEntity,
+    records: Iterable[Tuple[int, object]],
+    progress: Optional[Callable[[schemas.ImportReport], None]] = None
+) -> schemas.ImportReport:
+    spec = ENTITIES[entity]
+    report = schemas.ImportReport(entity=entity.value)
+    explicit_ids = False
+    records = iter(records)
+    while True:
+        batch = list(islice(records, config.IMPORT_BATCH_SIZE))
+        if not batch:
+            break
+        valid, failed = _validate(spec, batch)
+        failed.update(crud.import_parent_errors(db, spec.parents, valid))
+        rows = {row_number: row for row_number, row in valid.items() if row_number not in failed}
+        inserted, skipped = _write(db, spec, rows) if rows else (0, {})
+        db.commit()
+
+        explicit_ids = explicit_ids or any("id" in row for row in rows.values())
+        report.processed += len(batch)
+        report.inserted += inserted
+        report.skipped += len(rows) - inserted
+        report.failed += len(failed)
+        _record_errors(report, {**failed, **skipped})
+        rows_imported.inc(inserted, entity=entity.value, result="inserted")
+        rows_imported.inc(len(rows) - inserted, entity=entity.value, result="skipped")
+        rows_imported.inc(len(failed), entity=entity.value, result="failed")
+        if progress is not None:
+            progress(report)
+
+    if explicit_ids and "id" in spec.table.c:
+        crud.reset_id_sequence(db, spec.table)
+    logger.info(
+        "Imported %s: %d rows, %d inserted, %d skipped, %d failed",
+        entity.value, report.processed, report.inserted, report.skipped, report.failed
+    )
+    return report
+
+def run_import(
+    entity: ImportEntity,
+    import_format: ImportFormat,
+    chunks: Iterable[bytes],
+    progress: Optional[Callable[[schemas.ImportReport], None]] = None
+) -> schemas.ImportReport:
+    """Import one entity from raw bytes in its own session (imports outlive a request's)."""
+    db = SessionLocal()
+    try:
+        return import_records(db, entity, read_records(decode(chunks), import_format), progress)
+    finally:
+        db.close()
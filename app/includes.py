@@ -0,0 +1,142 @@
+"""Opt-in ``?include=`` expansion of related resources and ``?fields=`` sparse fieldsets.
+
+Every include name maps to a relationship path that is eager-loaded
+(``selectinload`` for collections, ``joinedload`` for many-to-one), so an
+expanded response runs one query per relationship level however many parent
+rows it has. Serialization only touches the attributes that were asked for,
+so nothing else is lazy-loaded. Tasks nested under an expansion carry a
+``comment_count`` computed with a single GROUP BY.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+import models
+
+INCLUDES = {
+    models.User: {"teams": ("teams",)},
+    models.Team: {
+        "members": ("members",),
+        "projects": ("projects",),
+        "tasks": ("projects", "tasks"),
+    },
+    models.Project: {
+        "team": ("team",),
+        "tasks": ("tasks",),
+        "comments": ("tasks", "comments"),
+    },
+    models.Task: {
+        "project": ("project",),
+        "comments": ("comments",),
+    },
+    # ?include_archived=true pages; same names as the live models
+    models.ArchivedTask: {
+        "project": ("project",),
+        "comments": ("comments",),
+    },
+}
+
+# Fields of nested objects; top-level objects keep their endpoint's schema fields
+FIELDS = {
+    models.User: ("id", "username", "email"),
+    models.Team: ("id", "name", "description"),
+    models.Project: ("id", "name", "description", "team_id"),
+    models.Task: ("id", "title", "description", "status", "priority", "deadline", "project_id"),
+    models.Comment: ("id", "text", "created_at", "task_id", "user_id"),
+}
+FIELDS[models.ArchivedTask] = FIELDS[models.Task]
+FIELDS[models.ArchivedComment] = FIELDS[models.Comment]
+
+class InvalidIncludeError(ValueError):
+    pass
+
+class InvalidFieldsError(ValueError):
+    pass
+
+def parse_include(model, include: Optional[str]) -> List[str]:
+    if not include:
+        return []
+    names = [name.strip() for name in include.split(",") if name.strip()]
+    allowed = INCLUDES.get(model, {})
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise InvalidIncludeError(
+            f"Unknown include: {', '.join(unknown)}. Allowed: {', '.join(allowed) or 'none'}"
+        )
+    return list(dict.fromkeys(names))
+
+def parse_fields(model, fields: Optional[str]) -> List[str]:
+    """The ``?fields=`` sparse fieldset, checked against ``FIELDS``; empty means the full schema."""
+    if not fields:
+        return []
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    allowed = FIELDS[model]
+    unknown = [name for name in names if name not in allowed]
+    if unknown or not names:
+        raise InvalidFieldsError(
+            f"Unknown field: {', '.join(unknown) or 'none given'}. Allowed: {', '.join(allowed)}"
+        )
+    return list(dict.fromkeys(names))
+
+def _tree(model, include: Sequence[str]) -> Dict[str, dict]:
+    tree: Dict[str, dict] = {}
+    for name in include:
+        node = tree
+        for attr in INCLUDES[model][name]:
+            node = node.setdefault(attr, {})
+    return tree
+
+def loader_options(model, include: Sequence[str]) -> list:
+    options = []
+    for name in include:
+        option, current = None, model
+        for attr in INCLUDES[model][name]:
+            relationship = getattr(current, attr)
+            strategy = selectinload if relationship.property.uselist else joinedload
+            option = strategy(relationship) if option is None else getattr(option, strategy.__name__)(relationship)
+            current = relationship.property.mapper.class_
+        options.append(option)
+    return options
+
+def _collect_tasks(objs: Iterable, tree: Dict[str, dict], found: List[models.Task], nested: bool):
+    for obj in objs:
+        if obj is None:
+            continue
+        if nested and isinstance(obj, models.Task):
+            found.append(obj)
+        for attr, subtree in tree.items():
+            value = getattr(obj, attr)
+            _collect_tasks(value if isinstance(value, list) else [value], subtree, found, True)
+
+def _comment_counts(db: Session, task_ids: List[int]) -> Dict[int, int]:
+    if not task_ids:
+        return {}
+    rows = db.execute(
+        select(models.Comment.task_id, func.count())
+        .where(models.Comment.task_id.in_(task_ids))
+        .group_by(models.Comment.task_id)
+    )
+    return dict(rows.all())
+
+def _serialize(obj, fields: Sequence[str], tree: Dict[str, dict], counts: Dict[int, int], nested: bool) -> Dict[str, Any]:
+    data = {field: getattr(obj, field) for field in fields}
+    if nested and isinstance(obj, models.Task):
+        data["comment_count"] = counts.get(obj.id, 0)
+    for attr, subtree in tree.items():
+        value = getattr(obj, attr)
+        if isinstance(value, list):
+            data[attr] = [
+                _serialize(item, FIELDS[type(item)], subtree, counts, True) for item in value
+            ]
+        elif value is not None:
+            data[attr] = _serialize(value, FIELDS[type(value)], subtree, counts, True)
+        else:
+            data[attr] = None
+    return data
+
+def serialize(db: Session, objs: Sequence, fields: Sequence[str], model, include: Sequence[str]) -> List[Dict[str, Any]]:
+    """Turn loaded ORM objects into dicts with ``fields`` plus the included relations."""
+    tree = _tree(model, include)
+    nested_tasks: List[models.Task] = []
+    _collect_tasks(objs, tree, nested_tasks, False)
+    counts = _comment_counts(db, [task.id for task in nested_tasks])
+    return [_serialize(obj, fields, tree, counts, False) for obj in objs]
@@ -0,0 +1,121 @@
+"""Per-request SQL query counting and slow-request logging.
+
+Engine event hooks add every statement's duration to the stats of the
+request that ran it; the stats object travels in a context variable, which
+is copied into the threadpool running sync endpoints. The middleware turns
+the stats into a ``Server-Timing`` header and histograms on GET /metrics, and
+logs requests over the configured query-count or latency thresholds, which
+is how N+1 regressions show up.
+"""
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import event
+import config
+import metrics
+
+logger = logging.getLogger("teamwork.slow_requests")
+
+request_seconds = metrics.Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route"
+)
+request_db_seconds = metrics.Histogram(
+    "http_request_db_seconds",
+    "Time spent in SQL statements per request, by route"
+)
+request_db_queries = metrics.Histogram(
+    "http_request_db_queries",
+    "Number of SQL statements per request, by route",
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+)
+query_seconds = metrics.Histogram(
+    "db_query_seconds",
+    "Duration of individual SQL statements"
+)
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "slowest_seconds", "slowest_statement")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+
+    def record(self, statement: str, seconds: float):
+        self.queries += 1
+        self.db_seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current_stats() -> Optional[RequestStats]:
+    return _current_stats.get()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append((context, time.perf_counter()))
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()[1]
+    query_seconds.observe(elapsed)
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; errors raised later,
+    # while fetching, find their entry already gone
+    conn = exception_context.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if starts and starts[-1][0] is exception_context.execution_context:
+        starts.pop()
+
+def instrument_engine(engine):
+    """Attach the timing hooks to a sync Engine (use ``AsyncEngine.sync_engine``)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+def _is_slow(stats: RequestStats, seconds: float) -> bool:
+    return (
+        stats.queries > config.SLOW_REQUEST_QUERIES
+        or seconds * 1000 > config.SLOW_REQUEST_MS
+    )
+
+async def query_stats_middleware(request: Request, call_next):
+    stats = RequestStats()
+    token = _current_stats.set(stats)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _current_stats.reset(token)
+    elapsed = time.perf_counter() - start
+
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", "unmatched")
+    request_seconds.observe(elapsed, method=request.method, route=route_path)
+    request_db_seconds.observe(stats.db_seconds, method=request.method, route=route_path)
+    request_db_queries.observe(stats.queries, method=request.method, route=route_path)
+
+    response.headers["Server-Timing"] = (
+        f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries", '
+        f"total;dur={elapsed * 1000:.2f}"
+    )
+    if config.LOG_SLOW_REQUESTS and _is_slow(stats, elapsed):
+        logger.warning(
+            "%s %s took %.1f ms with %d queries (%.1f ms in db); slowest %.1f ms: %s",
+            request.method,
+            route_path,
+            elapsed * 1000,
+            stats.queries,
+            stats.db_seconds * 1000,
+            stats.slowest_seconds * 1000,
+            (stats.slowest_statement or "")[:500]
+        )
+    return response
@@ -1,15 +1,71 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, WebSocket, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Optional, List
-from datetime import datetime
+from pydantic import ValidationError
+import anyio
+from typing import Optional, List, Dict, Any
+from datetime import date, datetime
 import models
 import schemas
 import crud
-from database import SessionLocal, engine
+import config
+import metrics
+import pagination
+import includes
+import http_cache
+import export
+import importer
+import search
+import sync
+import moderation
+import events
+import deadlines
+import archive
+import analytics
+import group_commit
+import instrumentation
+import async_api
+from database import SessionLocal, engine, async_engine
 
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One LISTEN connection per worker process feeds the event streams and
+    # the deadline scheduler
+    events.start(engine)
+    deadlines.start(engine)
+    archive.start(engine)
+    yield
+    await archive.stop()
+    await deadlines.stop()
+    events.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+instrumentation.instrument_engine(engine)
+if async_engine is not None:
+    instrumentation.instrument_engine(async_engine.sync_engine)
+app.middleware("http")(instrumentation.query_stats_middleware)
+
+# Registered first so the async handlers win over the sync ones below
+if config.DB_MODE == "async":
+    app.include_router(async_api.router)
+
+@app.exception_handler(pagination.InvalidCursorError)
+@app.exception_handler(includes.InvalidIncludeError)
+@app.exception_handler(includes.InvalidFieldsError)
+@app.exception_handler(importer.ImportFormatError)
+@app.exception_handler(search.InvalidSearchError)
+@app.exception_handler(analytics.InvalidStatsRangeError)
+def bad_query_handler(request: Request, exc: ValueError):
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={"detail": str(exc)}
+    )
 
 # Dependency
 def get_db():
@@ -19,30 +75,146 @@ def get_db():
     finally:
         db.close()
 
+def expand(db: Session, objs, schema, model, include: List[str]) -> List[Dict[str, Any]]:
+    """Serialize ``objs`` with the schema's fields plus the requested ?include= relations."""
+    return includes.serialize(db, objs, list(schema.model_fields), model, include)
+
+def sparse_response(db: Session, response: Response, objs, model, fields: List[str], include: List[str] = ()):
+    """A ?fields= page. It doesn't fit the endpoint's response_model, so it skips that
+    validation and goes straight to orjson, keeping the headers already set on ``response``."""
+    content = includes.serialize(db, objs, fields, model, include)
+    return ORJSONResponse(content, headers=dict(response.headers))
+
+# Bulk helpers
+def check_bulk_size(count: int):
+    if count > config.BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {config.BULK_MAX_ITEMS} items per request"
+        )
+
+def validate_bulk_items(items: List[Dict[str, Any]], schema):
+    """Validate each item on its own so one bad item doesn't reject the batch."""
+    check_bulk_size(len(items))
+    valid, errors = {}, []
+    for index, item in enumerate(items):
+        try:
+            valid[index] = schema.model_validate(item)
+        except ValidationError as exc:
+            message = "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in exc.errors()
+            )
+            errors.append(schemas.BulkItemResult(index=index, status="error", error=message))
+    return valid, errors
+
+def moderate_bulk_comments(comments: Dict[int, schemas.CommentBase]):
+    """Moderate every text of a bulk request in one pass; drop and report the rejected ones."""
+    reasons = moderation.check_many([comment.text for comment in comments.values()])
+    errors = [
+        schemas.BulkItemResult(index=index, status="error", error=f"text: {moderation.REJECTED_MESSAGE}")
+        for index, reason in zip(comments, reasons) if reason is not None
+    ]
+    allowed = {index: comment for (index, comment), reason in zip(comments.items(), reasons) if reason is None}
+    return allowed, errors
+
+def bulk_delete_results(ids: List[int], deleted, not_found: str) -> List[schemas.BulkItemResult]:
+    return [
+        schemas.BulkItemResult(index=index, id=item_id, status="deleted")
+        if item_id in deleted else
+        schemas.BulkItemResult(index=index, id=item_id, status="error", error=not_found)
+        for index, item_id in enumerate(ids)
+    ]
+
 # Users endpoints
 @app.post("/users/", response_model=schemas.UserBase, status_code=status.HTTP_201_CREATED)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if db_user:
+    db_user = crud.create_user(db=db, user=user)
+    if db_user is None:
+        # Only the conflict path pays for the lookup that picks the message
+        email_taken = crud.get_user_by_email(db, email=user.email) is not None
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
+            detail="Email already registered" if email_taken else "Username already taken"
         )
-    return crud.create_user(db=db, user=user)
+    return db_user
 
-@app.get("/users/", response_model=List[schemas.UserBase])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_users(db, skip=skip, limit=limit)
+@app.get(
+    "/users/",
+    response_model=List[schemas.UserDetail],
+    response_model_exclude_unset=True,
+    response_class=ORJSONResponse
+)
+def read_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    names = includes.parse_include(models.User, include)
+    users = crud.get_users(db, skip=skip, limit=limit, cursor=cursor, include=names)
+    pagination.set_next_cursor(response, users, crud.ID_ORDERING, limit)
+    return expand(db, users, schemas.UserBase, models.User, names)
 
-@app.get("/users/{user_id}", response_model=schemas.UserBase)
-def read_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = crud.get_user(db, user_id=user_id)
+@app.get("/users/{user_id}", response_model=schemas.UserDetail, response_model_exclude_unset=True)
+def read_user(user_id: int, include: Optional[str] = None, db: Session = Depends(get_db)):
+    names = includes.parse_include(models.User, include)
+    db_user = crud.get_user(db, user_id=user_id, include=names)
     if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    return db_user
+    return expand(db, [db_user], schemas.UserBase, models.User, names)[0]
+
+@app.get(
+    "/users/{user_id}/tasks",
+    response_model=List[schemas.TaskDetail],
+    response_model_exclude_unset=True,
+    response_class=ORJSONResponse
+)
+def read_user_tasks(
+    user_id: int,
+    response: Response,
+    limit: int = 100,
+    # Not named status: that would shadow fastapi.status used for the 404
+    task_status: Optional[schemas.StatusEnum] = Query(None, alias="status"),
+    priority: Optional[schemas.PriorityEnum] = None,
+    deadline_before: Optional[datetime] = None,
+    include_done: bool = False,
+    cursor: Optional[str] = None,
+    order_by: schemas.TaskOrderEnum = schemas.TaskOrderEnum.id,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """The user's work: tasks across all projects of all their teams. Done
+    tasks are left out unless ``include_done`` is set or ``status`` asks for them."""
+    names = includes.parse_include(models.Task, include)
+    field_names = includes.parse_fields(models.Task, fields)
+    if crud.get_user(db, user_id=user_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    tasks = crud.get_user_tasks(
+        db,
+        user_id=user_id,
+        limit=limit,
+        status=task_status,
+        priority=priority,
+        deadline_before=deadline_before,
+        include_done=include_done,
+        cursor=cursor,
+        order_by=order_by.value,
+        include=names,
+        fields=field_names
+    )
+    pagination.set_next_cursor(response, tasks, crud.TASK_ORDERINGS[order_by.value], limit)
+    if field_names:
+        return sparse_response(db, response, tasks, models.Task, field_names, names)
+    return expand(db, tasks, schemas.TaskOut, models.Task, names)
 
 @app.put("/users/{user_id}", response_model=schemas.UserBase)
 def update_user(
@@ -71,19 +243,51 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
 def create_team(team: schemas.TeamBase, db: Session = Depends(get_db)):
     return crud.create_team(db=db, team=team)
 
-@app.get("/teams/", response_model=List[schemas.TeamBase])
-def read_teams(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_teams(db, skip=skip, limit=limit)
+@app.get(
+    "/teams/",
+    response_model=List[schemas.TeamDetail],
+    response_model_exclude_unset=True,
+    response_class=ORJSONResponse
+)
+def read_teams(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    names = includes.parse_include(models.Team, include)
+    teams = crud.get_teams(db, skip=skip, limit=limit, cursor=cursor, include=names)
+    pagination.set_next_cursor(response, teams, crud.ID_ORDERING, limit)
+    return expand(db, teams, schemas.TeamBase, models.Team, names)
 
-@app.get("/teams/{team_id}", response_model=schemas.TeamBase)
-def read_team(team_id: int, db: Session = Depends(get_db)):
-    db_team = crud.get_team(db, team_id=team_id)
+@app.get("/teams/{team_id}", response_model=schemas.TeamDetail, response_model_exclude_unset=True)
+def read_team(team_id: int, include: Optional[str] = None, db: Session = Depends(get_db)):
+    names = includes.parse_include(models.Team, include)
+    db_team = crud.get_team(db, team_id=team_id, include=names)
     if db_team is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Team not found"
         )
-    return db_team
+    return expand(db, [db_team], schemas.TeamBase, models.Team, names)[0]
+
+@app.get("/teams/{team_id}/stats", response_model=schemas.Stats)
+def read_team_stats(
+    team_id: int,
+    from_day: Optional[date] = Query(None, alias="from"),
+    to_day: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
+    """Daily throughput, overdue counts, cycle-time percentiles and burndown
+    over the team's projects; the last 30 days by default."""
+    if crud.get_team(db, team_id=team_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
+        )
+    return analytics.get_stats(db, "team", team_id, from_day, to_day)
 
 @app.put("/teams/{team_id}", response_model=schemas.TeamBase)
 def update_team(
@@ -112,24 +316,53 @@ def delete_team(team_id: int, db: Session = Depends(get_db)):
 def create_project(project: schemas.ProjectBase, db: Session = Depends(get_db)):
     return crud.create_project(db=db, project=project)
 
-@app.get("/projects/", response_model=List[schemas.ProjectBase])
+@app.get(
+    "/projects/",
+    response_model=List[schemas.ProjectDetail],
+    response_model_exclude_unset=True,
+    response_class=ORJSONResponse
+)
 def read_projects(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     team_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    return crud.get_projects(db, skip=skip, limit=limit, team_id=team_id)
+    names = includes.parse_include(models.Project, include)
+    projects = crud.get_projects(
+        db,
+        skip=skip,
+        limit=limit,
+        team_id=team_id,
+        cursor=cursor,
+        include=names
+    )
+    pagination.set_next_cursor(response, projects, crud.ID_ORDERING, limit)
+    return expand(db, projects, schemas.ProjectBase, models.Project, names)
 
-@app.get("/projects/{project_id}", response_model=schemas.ProjectBase)
-def read_project(project_id: int, db: Session = Depends(get_db)):
-    db_project = crud.get_project(db, project_id=project_id)
+@app.get("/projects/{project_id}", response_model=schemas.ProjectDetail, response_model_exclude_unset=True)
+def read_project(
+    request: Request,
+    response: Response,
+    project_id: int,
+    include: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    names = includes.parse_include(models.Project, include)
+    db_project = crud.get_project(db, project_id=project_id, include=names)
     if db_project is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
-    return db_project
+    if not names:
+        etag = http_cache.entity_etag(db_project)
+        if http_cache.not_modified(request, response, etag, db_project.updated_at):
+            return http_cache.not_modified_response(response)
+    return expand(db, [db_project], schemas.ProjectBase, models.Project, names)[0]
 
 @app.put("/projects/{project_id}", response_model=schemas.ProjectBase)
 def update_project(
@@ -153,42 +386,192 @@ def delete_project(project_id: int, db: Session = Depends(get_db)):
             detail="Project not found"
         )
 
+@app.get("/projects/{project_id}/board", response_model=schemas.Board)
+def read_project_board(
+    project_id: int,
+    column_limit: int = 20,
+    order_by: schemas.TaskOrderEnum = schemas.TaskOrderEnum.id,
+    db: Session = Depends(get_db)
+):
+    """Task counts per status column with overdue and priority breakdowns,
+    plus the first ``column_limit`` tasks of each column (0 for headers only)."""
+    if crud.get_project(db, project_id=project_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    return crud.get_board(db, project_id=project_id, column_limit=column_limit, order_by=order_by.value)
+
+@app.get("/projects/{project_id}/stats", response_model=schemas.Stats)
+def read_project_stats(
+    project_id: int,
+    from_day: Optional[date] = Query(None, alias="from"),
+    to_day: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
+    """Daily throughput, overdue counts, cycle-time percentiles and burndown,
+    read from the rollups; the last 30 days by default."""
+    if crud.get_project(db, project_id=project_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    return analytics.get_stats(db, "project", project_id, from_day, to_day)
+
+@app.get("/projects/{project_id}/export")
+def export_project(
+    project_id: int,
+    format: export.ExportFormat = export.ExportFormat.ndjson,
+    db: Session = Depends(get_db)
+):
+    if crud.get_project(db, project_id=project_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    return StreamingResponse(
+        export.stream_project(project_id, format),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="project-{project_id}.{format.value}"'}
+    )
+
+# Live project events
+def project_exists(project_id: int) -> bool:
+    # Own short session: a stream outlives the request's dependencies
+    db = SessionLocal()
+    try:
+        return crud.get_project(db, project_id=project_id) is not None
+    finally:
+        db.close()
+
+@app.get("/projects/{project_id}/events")
+async def stream_project_events(
+    project_id: int,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[int] = Header(None, alias="Last-Event-ID")
+):
+    """Server-sent task and comment events. Browsers resume with the
+    Last-Event-ID header on reconnect; ``?last_event_id=`` does the same."""
+    if not await run_in_threadpool(project_exists, project_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+
+    async def body():
+        yield f"retry: {config.EVENTS_RETRY_MS}\n\n"
+        async for event in events.follow(project_id, last_event_id_header or last_event_id):
+            yield ": ping\n\n" if event is None else event.sse()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/projects/{project_id}/events/ws")
+async def project_events_socket(websocket: WebSocket, project_id: int, last_event_id: Optional[int] = None):
+    """The same events as JSON messages; an ``overflow`` message is followed by a close."""
+    if not await run_in_threadpool(project_exists, project_id):
+        await websocket.close(code=1008, reason="Project not found")
+        return
+    await websocket.accept()
+
+    async def send_events():
+        async for event in events.follow(project_id, last_event_id):
+            await websocket.send_json({"type": "ping"} if event is None else jsonable_encoder(event.message()))
+            if event is not None and event.type == "overflow":
+                await websocket.close(code=1013, reason="Subscriber fell behind; reconnect with last_event_id")
+                break
+        tasks.cancel_scope.cancel()
+
+    async with anyio.create_task_group() as tasks:
+        tasks.start_soon(send_events)
+        # Clients don't send anything; reading just notices a disconnect right away
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+        tasks.cancel_scope.cancel()
+
 # Tasks endpoints
-@app.post("/tasks/", response_model=schemas.TaskBase, status_code=status.HTTP_201_CREATED)
+@app.post("/tasks/", response_model=schemas.TaskOut, status_code=status.HTTP_201_CREATED)
 def create_task(task: schemas.TaskBase, db: Session = Depends(get_db)):
     return crud.create_task(db=db, task=task)
 
-@app.get("/tasks/", response_model=List[schemas.TaskBase])
+@app.post("/tasks/bulk", response_model=List[schemas.BulkItemResult])
+def create_tasks_bulk(items: List[Dict[str, Any]], db: Session = Depends(get_db)):
+    tasks, errors = validate_bulk_items(items, schemas.TaskBase)
+    results = errors + crud.create_tasks(db, tasks=tasks)
+    return sorted(results, key=lambda r: r.index)
+
+@app.patch("/tasks/bulk", response_model=List[schemas.BulkItemResult])
+def update_tasks_bulk(items: List[Dict[str, Any]], db: Session = Depends(get_db)):
+    tasks, errors = validate_bulk_items(items, schemas.TaskBulkUpdate)
+    results = errors + crud.update_tasks(db, tasks=tasks)
+    return sorted(results, key=lambda r: r.index)
+
+@app.delete("/tasks/bulk", response_model=List[schemas.BulkItemResult])
+def delete_tasks_bulk(body: schemas.BulkDelete, db: Session = Depends(get_db)):
+    check_bulk_size(len(body.ids))
+    deleted = crud.delete_tasks(db, task_ids=body.ids)
+    return bulk_delete_results(body.ids, deleted, "Task not found")
+
+@app.get(
+    "/tasks/",
+    response_model=List[schemas.TaskDetail],
+    response_model_exclude_unset=True,
+    response_class=ORJSONResponse
+)
 def read_tasks(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     project_id: Optional[int] = None,
     status: Optional[schemas.StatusEnum] = None,
     priority: Optional[schemas.PriorityEnum] = None,
     deadline_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    order_by: schemas.TaskOrderEnum = schemas.TaskOrderEnum.id,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+    include_archived: bool = False,
     db: Session = Depends(get_db)
 ):
-    return crud.get_tasks(
+    names = includes.parse_include(models.Task, include)
+    field_names = includes.parse_fields(models.Task, fields)
+    tasks = crud.get_tasks(
         db,
         skip=skip,
         limit=limit,
         project_id=project_id,
         status=status,
         priority=priority,
-        deadline_before=deadline_before
+        deadline_before=deadline_before,
+        cursor=cursor,
+        order_by=order_by.value,
+        include=names,
+        fields=field_names,
+        include_archived=include_archived
     )
+    if not names and http_cache.not_modified(request, response, http_cache.page_etag(request, tasks), None):
+        return http_cache.not_modified_response(response)
+    pagination.set_next_cursor(response, tasks, crud.TASK_ORDERINGS[order_by.value], limit)
+    if field_names:
+        return sparse_response(db, response, tasks, models.Task, field_names, names)
+    return expand(db, tasks, schemas.TaskOut, models.Task, names)
 
-@app.get("/tasks/{task_id}", response_model=schemas.TaskBase)
-def read_task(task_id: int, db: Session = Depends(get_db)):
-    db_task = crud.get_task(db, task_id=task_id)
+@app.get("/tasks/{task_id}", response_model=schemas.TaskDetail, response_model_exclude_unset=True)
+def read_task(task_id: int, include: Optional[str] = None, db: Session = Depends(get_db)):
+    names = includes.parse_include(models.Task, include)
+    db_task = crud.get_task(db, task_id=task_id, include=names)
     if db_task is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task not found"
         )
-    return db_task
+    return expand(db, [db_task], schemas.TaskOut, models.Task, names)[0]
 
-@app.put("/tasks/{task_id}", response_model=schemas.TaskBase)
+@app.put("/tasks/{task_id}", response_model=schemas.TaskOut)
 def update_task(
     task_id: int,
     task: schemas.TaskBase,
@@ -213,16 +596,61 @@ def delete_task(task_id: int, db: Session = Depends(get_db)):
 # Comments endpoints
 @app.post("/comments/", response_model=schemas.CommentBase, status_code=status.HTTP_201_CREATED)
 def create_comment(comment: schemas.CommentBase, db: Session = Depends(get_db)):
+    moderation.ensure_allowed(comment.text)
+    if config.COMMENT_GROUP_COMMIT:
+        return group_commit.comments.submit(comment)
     return crud.create_comment(db=db, comment=comment)
 
-@app.get("/comments/", response_model=List[schemas.CommentBase])
+@app.post("/comments/bulk", response_model=List[schemas.BulkItemResult])
+def create_comments_bulk(items: List[Dict[str, Any]], db: Session = Depends(get_db)):
+    comments, errors = validate_bulk_items(items, schemas.CommentBase)
+    comments, rejected = moderate_bulk_comments(comments)
+    results = errors + rejected + crud.create_comments(db, comments=comments)
+    return sorted(results, key=lambda r: r.index)
+
+@app.patch("/comments/bulk", response_model=List[schemas.BulkItemResult])
+def update_comments_bulk(items: List[Dict[str, Any]], db: Session = Depends(get_db)):
+    comments, errors = validate_bulk_items(items, schemas.CommentBulkUpdate)
+    comments, rejected = moderate_bulk_comments(comments)
+    results = errors + rejected + crud.update_comments(db, comments=comments)
+    return sorted(results, key=lambda r: r.index)
+
+@app.delete("/comments/bulk", response_model=List[schemas.BulkItemResult])
+def delete_comments_bulk(body: schemas.BulkDelete, db: Session = Depends(get_db)):
+    check_bulk_size(len(body.ids))
+    deleted = crud.delete_comments(db, comment_ids=body.ids)
+    return bulk_delete_results(body.ids, deleted, "Comment not found")
+
+@app.get("/comments/", response_model=List[schemas.CommentBase], response_class=ORJSONResponse)
 def read_comments(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     task_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    order_by: schemas.CommentOrderEnum = schemas.CommentOrderEnum.id,
+    fields: Optional[str] = None,
+    include_archived: bool = False,
     db: Session = Depends(get_db)
 ):
-    return crud.get_comments(db, skip=skip, limit=limit, task_id=task_id)
+    field_names = includes.parse_fields(models.Comment, fields)
+    comments = crud.get_comments(
+        db,
+        skip=skip,
+        limit=limit,
+        task_id=task_id,
+        cursor=cursor,
+        order_by=order_by.value,
+        fields=field_names,
+        include_archived=include_archived
+    )
+    if http_cache.not_modified(request, response, http_cache.page_etag(request, comments), None):
+        return http_cache.not_modified_response(response)
+    pagination.set_next_cursor(response, comments, crud.COMMENT_ORDERINGS[order_by.value], limit)
+    if field_names:
+        return sparse_response(db, response, comments, models.Comment, field_names)
+    return comments
 
 @app.get("/comments/{comment_id}", response_model=schemas.CommentBase)
 def read_comment(comment_id: int, db: Session = Depends(get_db)):
@@ -240,6 +668,7 @@ def update_comment(
     comment: schemas.CommentBase,
     db: Session = Depends(get_db)
 ):
+    moderation.ensure_allowed(comment.text)
     db_comment = crud.update_comment(db, comment_id=comment_id, comment_update=comment)
     if db_comment is None:
         raise HTTPException(
@@ -257,29 +686,62 @@ def delete_comment(comment_id: int, db: Session = Depends(get_db)):
         )
 
 # Team Members endpoints
-@app.post("/teams/{team_id}/members/{user_id}", status_code=status.HTTP_201_CREATED)
-def add_team_member(
+def ensure_team_and_user(db: Session, team_id: int, user_id: int):
+    if crud.get_team(db, team_id=team_id) is None or crud.get_user(db, user_id=user_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team or User not found"
+        )
+
+@app.post("/teams/{team_id}/members/bulk", response_model=schemas.TeamMembersBulkResult)
+def add_team_members(
     team_id: int,
-    user_id: int,
+    body: schemas.TeamMembersBulk,
     db: Session = Depends(get_db)
 ):
-    team = crud.get_team(db, team_id=team_id)
-    user = crud.get_user(db, user_id=user_id)
-    
-    if not team or not user:
+    check_bulk_size(len(body.user_ids))
+    added = crud.add_team_members(db, team_id=team_id, user_ids=body.user_ids)
+    if not added and crud.get_team(db, team_id=team_id) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Team or User not found"
+            detail="Team not found"
+        )
+    return schemas.TeamMembersBulkResult(
+        added=sorted(added),
+        skipped=sorted(set(body.user_ids) - added)
+    )
+
+@app.delete("/teams/{team_id}/members/bulk", response_model=schemas.TeamMembersBulkResult)
+def remove_team_members(
+    team_id: int,
+    body: schemas.TeamMembersBulk,
+    db: Session = Depends(get_db)
+):
+    check_bulk_size(len(body.user_ids))
+    removed = crud.remove_team_members(db, team_id=team_id, user_ids=body.user_ids)
+    if not removed and crud.get_team(db, team_id=team_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
         )
-    
-    if user in team.members:
+    return schemas.TeamMembersBulkResult(
+        removed=sorted(removed),
+        skipped=sorted(set(body.user_ids) - removed)
+    )
+
+@app.post("/teams/{team_id}/members/{user_id}", status_code=status.HTTP_201_CREATED)
+def add_team_member(
+    team_id: int,
+    user_id: int,
+    db: Session = Depends(get_db)
+):
+    if not crud.add_team_members(db, team_id=team_id, user_ids=[user_id]):
+        # Nothing inserted: either a missing row or an existing membership
+        ensure_team_and_user(db, team_id, user_id)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User already in team"
         )
-    
-    team.members.append(user)
-    db.commit()
     return {"message": "Member added successfully"}
 
 @app.delete("/teams/{team_id}/members/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -288,20 +750,91 @@ def remove_team_member(
     user_id: int,
     db: Session = Depends(get_db)
 ):
-    team = crud.get_team(db, team_id=team_id)
-    user = crud.get_user(db, user_id=user_id)
-    
-    if not team or not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Team or User not found"
-        )
-    
-    if user not in team.members:
+    if not crud.remove_team_members(db, team_id=team_id, user_ids=[user_id]):
+        ensure_team_and_user(db, team_id, user_id)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User is not a member of this team"
         )
-    
-    team.members.remove(user)
-    db.commit()
\ No newline at end of file
+
+# Search endpoint
+@app.get("/search", response_model=List[schemas.SearchResult])
+def search_tasks_and_comments(
+    response: Response,
+    q: str,
+    type: schemas.SearchTypeEnum = schemas.SearchTypeEnum.all,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    kinds = ["task", "comment"] if type == schemas.SearchTypeEnum.all else [type.value]
+    results = search.search(db, q, kinds, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, results, search.CURSOR_KEYS, limit)
+    return results
+
+# Delta sync endpoint
+@app.get("/sync", response_model=schemas.SyncPage, response_class=ORJSONResponse)
+def sync_changes(
+    since: Optional[str] = None,
+    limit: int = Query(config.SYNC_PAGE_SIZE, ge=1, le=config.SYNC_MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """Users, teams, projects, tasks and comments changed after ``since``, in
+    change order, with tombstones for deletes. Without ``since`` it pages
+    through everything; keep calling with ``next_token`` while ``has_more``."""
+    try:
+        return sync.changes(db, since, limit)
+    except sync.SyncUnavailableError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(exc),
+            headers={"Retry-After": "1"}
+        )
+
+# Import endpoint
+def check_import_size(size: int):
+    if size > config.IMPORT_MAX_BODY_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {config.IMPORT_MAX_BODY_BYTES} bytes per import; use import_data.py for larger files"
+        )
+
+def request_chunks(request: Request):
+    """Blocking iterator over the request body, for use from a threadpool worker.
+    Raises a 413 once the body grows past IMPORT_MAX_BODY_BYTES."""
+    stream = request.stream()
+    received = 0
+    while True:
+        try:
+            chunk = anyio.from_thread.run(stream.__anext__)
+        except StopAsyncIteration:
+            return
+        received += len(chunk)
+        check_import_size(received)
+        yield chunk
+
+@app.post("/import", response_model=schemas.ImportReport)
+async def import_data(
+    request: Request,
+    entity: importer.ImportEntity,
+    format: Optional[importer.ImportFormat] = None
+):
+    """Stream a JSON array, NDJSON or CSV body of one entity into the database.
+
+    Import files in ``importer.IMPORT_ORDER`` so parents exist before their children.
+    The report comes back once the whole body is imported, with no progress
+    before that; ``import_data.py`` prints it after every batch and suits
+    big loads better. Bodies over IMPORT_MAX_BODY_BYTES get a 413: up front
+    if Content-Length says so, otherwise once that much has been read, with
+    the batches before it already written.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        check_import_size(int(content_length))
+    import_format = format or importer.format_for_content_type(request.headers.get("content-type"))
+    return await run_in_threadpool(importer.run_import, entity, import_format, request_chunks(request))
+
+# Metrics endpoint
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""Apply the SQL migrations in migrations/ that have not run yet.
+
+    python migrate.py            # run from the app/ directory, like main.py
+
+Fresh databases get the full schema from ``create_all`` in main.py; these
+files bring existing PostgreSQL databases up to date and are safe to run on
+a fresh one. They run in file name order and are recorded in
+schema_migrations. A file whose first line is ``-- migrate:no-transaction``
+runs statement by statement in autocommit mode, which
+``CREATE INDEX CONCURRENTLY`` requires.
+"""
+import os
+from typing import List
+from sqlalchemy import text
+from database import engine
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+
+def split_statements(sql: str) -> List[str]:
+    """Split a script on top-level semicolons, leaving $$-quoted bodies intact."""
+    statements, current, in_dollar_quote = [], [], False
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if not in_dollar_quote and (not stripped or stripped.startswith("--")):
+            continue
+        current.append(line)
+        if line.count("$$") % 2:
+            in_dollar_quote = not in_dollar_quote
+        if not in_dollar_quote and stripped.endswith(";"):
+            statements.append("\n".join(current))
+            current = []
+    if current:
+        statements.append("\n".join(current))
+    return statements
+
+def pending_migrations(conn) -> List[str]:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMP NOT NULL DEFAULT now())"
+    ))
+    applied = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+    files = sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith(".sql"))
+    return [f for f in files if f[:-4] not in applied]
+
+def apply_migration(filename: str):
+    with open(os.path.join(MIGRATIONS_DIR, filename), encoding="utf-8") as f:
+        sql = f.read()
+    version = filename[:-4]
+    record = text("INSERT INTO schema_migrations (version) VALUES (:version)")
+    if sql.startswith(NO_TRANSACTION_MARKER):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for statement in split_statements(sql):
+                conn.exec_driver_sql(statement)
+            conn.execute(record, {"version": version})
+    else:
+        with engine.begin() as conn:
+            for statement in split_statements(sql):
+                conn.exec_driver_sql(statement)
+            conn.execute(record, {"version": version})
+
+def migrate():
+    if engine.dialect.name != "postgresql":
+        print(f"Migrations target PostgreSQL, skipping for {engine.dialect.name}")
+        return
+    with engine.begin() as conn:
+        pending = pending_migrations(conn)
+    for filename in pending:
+        print(f"Applying {filename}...")
+        apply_migration(filename)
+    print("Database is up to date" if not pending else f"Applied {len(pending)} migration(s)")
+
+if __name__ == "__main__":
+    migrate()
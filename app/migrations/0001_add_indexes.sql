@@ -0,0 +1,28 @@
+-- migrate:no-transaction
+-- Indexes for the foreign keys and the filters used by crud.get_tasks and
+-- crud.get_comments. CONCURRENTLY keeps the tables writable while they build.
+
+-- user_team gets a composite primary key, so drop duplicate and half-empty rows first
+DELETE FROM user_team a
+    USING user_team b
+    WHERE a.ctid < b.ctid AND a.user_id = b.user_id AND a.team_id = b.team_id;
+DELETE FROM user_team WHERE user_id IS NULL OR team_id IS NULL;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS user_team_pkey ON user_team (user_id, team_id);
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'user_team_pkey') THEN
+        ALTER TABLE user_team ADD CONSTRAINT user_team_pkey PRIMARY KEY USING INDEX user_team_pkey;
+    END IF;
+END
+$$;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_team_team_id ON user_team (team_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_projects_team_id ON projects (team_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_project_status_priority ON tasks (project_id, status, priority);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_project_deadline ON tasks (project_id, deadline);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_deadline_id ON tasks (deadline, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comments_task_created_at ON comments (task_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comments_user_id ON comments (user_id);
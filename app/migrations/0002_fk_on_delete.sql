@@ -0,0 +1,37 @@
+-- Let the database handle dependent rows, so deletes in crud.py can be a
+-- single DELETE ... RETURNING. This matches what the ORM did before:
+-- membership rows are removed and child foreign keys are set to NULL.
+-- NOT VALID + VALIDATE avoids holding the strong lock while existing rows are checked.
+
+ALTER TABLE user_team
+    DROP CONSTRAINT IF EXISTS user_team_user_id_fkey,
+    ADD CONSTRAINT user_team_user_id_fkey FOREIGN KEY (user_id)
+        REFERENCES users (id) ON DELETE CASCADE NOT VALID,
+    DROP CONSTRAINT IF EXISTS user_team_team_id_fkey,
+    ADD CONSTRAINT user_team_team_id_fkey FOREIGN KEY (team_id)
+        REFERENCES teams (id) ON DELETE CASCADE NOT VALID;
+
+ALTER TABLE projects
+    DROP CONSTRAINT IF EXISTS projects_team_id_fkey,
+    ADD CONSTRAINT projects_team_id_fkey FOREIGN KEY (team_id)
+        REFERENCES teams (id) ON DELETE SET NULL NOT VALID;
+
+ALTER TABLE tasks
+    DROP CONSTRAINT IF EXISTS tasks_project_id_fkey,
+    ADD CONSTRAINT tasks_project_id_fkey FOREIGN KEY (project_id)
+        REFERENCES projects (id) ON DELETE SET NULL NOT VALID;
+
+ALTER TABLE comments
+    DROP CONSTRAINT IF EXISTS comments_task_id_fkey,
+    ADD CONSTRAINT comments_task_id_fkey FOREIGN KEY (task_id)
+        REFERENCES tasks (id) ON DELETE SET NULL NOT VALID,
+    DROP CONSTRAINT IF EXISTS comments_user_id_fkey,
+    ADD CONSTRAINT comments_user_id_fkey FOREIGN KEY (user_id)
+        REFERENCES users (id) ON DELETE SET NULL NOT VALID;
+
+ALTER TABLE user_team VALIDATE CONSTRAINT user_team_user_id_fkey;
+ALTER TABLE user_team VALIDATE CONSTRAINT user_team_team_id_fkey;
+ALTER TABLE projects VALIDATE CONSTRAINT projects_team_id_fkey;
+ALTER TABLE tasks VALIDATE CONSTRAINT tasks_project_id_fkey;
+ALTER TABLE comments VALIDATE CONSTRAINT comments_task_id_fkey;
+ALTER TABLE comments VALIDATE CONSTRAINT comments_user_id_fkey;
@@ -0,0 +1,26 @@
+-- updated_at / version on every entity table, used for ETag and
+-- Last-Modified on the read endpoints. now() is stable, so PostgreSQL 11+
+-- stores the default once instead of rewriting the tables.
+-- The comments.created_at default was the literal 'now()', which PostgreSQL
+-- evaluated once when the table was created; make it a real now() call.
+
+ALTER TABLE users
+    ADD COLUMN IF NOT EXISTS updated_at timestamp NOT NULL DEFAULT now(),
+    ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1;
+
+ALTER TABLE teams
+    ADD COLUMN IF NOT EXISTS updated_at timestamp NOT NULL DEFAULT now(),
+    ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1;
+
+ALTER TABLE projects
+    ADD COLUMN IF NOT EXISTS updated_at timestamp NOT NULL DEFAULT now(),
+    ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1;
+
+ALTER TABLE tasks
+    ADD COLUMN IF NOT EXISTS updated_at timestamp NOT NULL DEFAULT now(),
+    ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1;
+
+ALTER TABLE comments
+    ADD COLUMN IF NOT EXISTS updated_at timestamp NOT NULL DEFAULT now(),
+    ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1,
+    ALTER COLUMN created_at SET DEFAULT now();
@@ -0,0 +1,20 @@
+-- migrate:no-transaction
+-- Full-text and trigram search for GET /search (see search.py).
+-- Adding a STORED generated column rewrites the table once; the indexes are
+-- built CONCURRENTLY so the tables stay writable meanwhile.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+) STORED;
+
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    to_tsvector('simple', coalesce(text, ''))
+) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_search_vector ON tasks USING gin (search_vector);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_title_trgm ON tasks USING gin (title gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comments_search_vector ON comments USING gin (search_vector);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comments_text_trgm ON comments USING gin (text gin_trgm_ops);
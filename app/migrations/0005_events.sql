@@ -0,0 +1,5 @@
+-- Ids of the live project events sent with pg_notify (see events.py); one
+-- sequence so every worker numbers events the same way and clients can
+-- resume on any of them.
+
+CREATE SEQUENCE IF NOT EXISTS project_event_seq;
@@ -0,0 +1,41 @@
+-- Task analytics for GET /projects/{id}/stats and GET /teams/{id}/stats (see
+-- analytics.py): the append-only status history, recorded deadline misses
+-- and the daily rollups built from them. Only changes from now on are
+-- counted; existing tasks have no history, so they get no cycle time.
+
+CREATE TABLE IF NOT EXISTS task_status_transitions (
+    id SERIAL PRIMARY KEY,
+    task_id integer NOT NULL,
+    project_id integer,
+    from_status varchar(20),
+    to_status varchar(20) NOT NULL,
+    changed_at timestamp NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_task_status_transitions_task_changed_at
+    ON task_status_transitions (task_id, changed_at);
+
+CREATE TABLE IF NOT EXISTS task_deadline_misses (
+    task_id integer NOT NULL,
+    deadline timestamp NOT NULL,
+    PRIMARY KEY (task_id, deadline)
+);
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    scope varchar(10) NOT NULL,
+    scope_id integer NOT NULL,
+    day date NOT NULL,
+    created integer NOT NULL DEFAULT 0,
+    completed integer NOT NULL DEFAULT 0,
+    reopened integer NOT NULL DEFAULT 0,
+    overdue integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, scope_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS daily_cycle_times (
+    scope varchar(10) NOT NULL,
+    scope_id integer NOT NULL,
+    day date NOT NULL,
+    bucket integer NOT NULL,
+    count integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, scope_id, day, bucket)
+);
@@ -0,0 +1,76 @@
+-- migrate:no-transaction
+-- Change numbers and tombstones for GET /sync (see sync.py). Triggers stamp
+-- every insert and update with nextval('change_seq') and record deletes in
+-- sync_tombstones. They are installed before the backfill, so rows written
+-- meanwhile are numbered too. The backfill rewrites every row once; the
+-- indexes are built CONCURRENTLY so the tables stay writable meanwhile.
+
+CREATE SEQUENCE IF NOT EXISTS change_seq;
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS change_seq bigint;
+ALTER TABLE teams ADD COLUMN IF NOT EXISTS change_seq bigint;
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS change_seq bigint;
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS change_seq bigint;
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS change_seq bigint;
+
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    seq bigint PRIMARY KEY,
+    entity varchar(20) NOT NULL,
+    entity_id integer NOT NULL,
+    deleted_at timestamp NOT NULL DEFAULT now()
+);
+
+-- Writers hold advisory lock 7140323 (shared) until they finish, so a sync
+-- can wait for numbers that are taken but not yet committed
+CREATE OR REPLACE FUNCTION sync_stamp() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared(7140323);
+    NEW.change_seq := nextval('change_seq');
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sync_tombstone() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared(7140323);
+    INSERT INTO sync_tombstones (seq, entity, entity_id, deleted_at)
+    VALUES (nextval('change_seq'), TG_ARGV[0], OLD.id, now());
+    RETURN OLD;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_sync_stamp ON users;
+CREATE TRIGGER users_sync_stamp BEFORE INSERT OR UPDATE ON users FOR EACH ROW EXECUTE FUNCTION sync_stamp();
+DROP TRIGGER IF EXISTS users_sync_tombstone ON users;
+CREATE TRIGGER users_sync_tombstone AFTER DELETE ON users FOR EACH ROW EXECUTE FUNCTION sync_tombstone('user');
+
+DROP TRIGGER IF EXISTS teams_sync_stamp ON teams;
+CREATE TRIGGER teams_sync_stamp BEFORE INSERT OR UPDATE ON teams FOR EACH ROW EXECUTE FUNCTION sync_stamp();
+DROP TRIGGER IF EXISTS teams_sync_tombstone ON teams;
+CREATE TRIGGER teams_sync_tombstone AFTER DELETE ON teams FOR EACH ROW EXECUTE FUNCTION sync_tombstone('team');
+
+DROP TRIGGER IF EXISTS projects_sync_stamp ON projects;
+CREATE TRIGGER projects_sync_stamp BEFORE INSERT OR UPDATE ON projects FOR EACH ROW EXECUTE FUNCTION sync_stamp();
+DROP TRIGGER IF EXISTS projects_sync_tombstone ON projects;
+CREATE TRIGGER projects_sync_tombstone AFTER DELETE ON projects FOR EACH ROW EXECUTE FUNCTION sync_tombstone('project');
+
+DROP TRIGGER IF EXISTS tasks_sync_stamp ON tasks;
+CREATE TRIGGER tasks_sync_stamp BEFORE INSERT OR UPDATE ON tasks FOR EACH ROW EXECUTE FUNCTION sync_stamp();
+DROP TRIGGER IF EXISTS tasks_sync_tombstone ON tasks;
+CREATE TRIGGER tasks_sync_tombstone AFTER DELETE ON tasks FOR EACH ROW EXECUTE FUNCTION sync_tombstone('task');
+
+DROP TRIGGER IF EXISTS comments_sync_stamp ON comments;
+CREATE TRIGGER comments_sync_stamp BEFORE INSERT OR UPDATE ON comments FOR EACH ROW EXECUTE FUNCTION sync_stamp();
+DROP TRIGGER IF EXISTS comments_sync_tombstone ON comments;
+CREATE TRIGGER comments_sync_tombstone AFTER DELETE ON comments FOR EACH ROW EXECUTE FUNCTION sync_tombstone('comment');
+
+-- The stamp trigger numbers the rows
+UPDATE users SET change_seq = NULL WHERE change_seq IS NULL;
+UPDATE teams SET change_seq = NULL WHERE change_seq IS NULL;
+UPDATE projects SET change_seq = NULL WHERE change_seq IS NULL;
+UPDATE tasks SET change_seq = NULL WHERE change_seq IS NULL;
+UPDATE comments SET change_seq = NULL WHERE change_seq IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_change_seq ON users (change_seq);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_teams_change_seq ON teams (change_seq);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_projects_change_seq ON projects (change_seq);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_change_seq ON tasks (change_seq);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comments_change_seq ON comments (change_seq);
@@ -0,0 +1,35 @@
+-- Archive tables for done tasks and their comments (see archive.py). Rows
+-- keep their ids, versions and timestamps; the archiver fills them in
+-- batches once ARCHIVE_ENABLED is on.
+
+CREATE TABLE IF NOT EXISTS tasks_archive (
+    id integer PRIMARY KEY,
+    title varchar(100) NOT NULL,
+    description varchar(500),
+    status varchar(20),
+    priority varchar(20),
+    deadline timestamp,
+    project_id integer REFERENCES projects (id) ON DELETE SET NULL,
+    updated_at timestamp NOT NULL,
+    version integer NOT NULL,
+    archived_at timestamp NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS ix_tasks_archive_project_status_priority
+    ON tasks_archive (project_id, status, priority);
+CREATE INDEX IF NOT EXISTS ix_tasks_archive_project_deadline
+    ON tasks_archive (project_id, deadline);
+
+CREATE TABLE IF NOT EXISTS comments_archive (
+    id integer PRIMARY KEY,
+    text varchar(500) NOT NULL,
+    created_at timestamp,
+    task_id integer REFERENCES tasks_archive (id),
+    user_id integer REFERENCES users (id) ON DELETE SET NULL,
+    updated_at timestamp NOT NULL,
+    version integer NOT NULL,
+    archived_at timestamp NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS ix_comments_archive_task_created_at
+    ON comments_archive (task_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_comments_archive_user_id
+    ON comments_archive (user_id);
@@ -0,0 +1,15 @@
+-- Archiving moves rows to the archive tables rather than deleting them, so
+-- its deletes must not tell GET /sync clients the rows are gone. The
+-- archiver sets teamwork.skip_tombstones to 'on' for its transaction (see
+-- sync.without_tombstones) and the tombstone trigger then does nothing.
+
+CREATE OR REPLACE FUNCTION sync_tombstone() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('teamwork.skip_tombstones', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    PERFORM pg_advisory_xact_lock_shared(7140323);
+    INSERT INTO sync_tombstones (seq, entity, entity_id, deleted_at)
+    VALUES (nextval('change_seq'), TG_ARGV[0], OLD.id, now());
+    RETURN OLD;
+END $$ LANGUAGE plpgsql;
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table
+from sqlalchemy import Column, BigInteger, Integer, String, Date, DateTime, FetchedValue, ForeignKey, Table, Index, func, literal_column
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -6,53 +6,154 @@ from database import Base
 user_team = Table(
     'user_team',
     Base.metadata,
-    Column('user_id', Integer, ForeignKey('users.id')),
-    Column('team_id', Integer, ForeignKey('teams.id'))
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    Column('team_id', Integer, ForeignKey('teams.id', ondelete='CASCADE'), primary_key=True, index=True)
 )
 
-class User(Base):
+class Versioned:
+    """Row change tracking for ETag / Last-Modified: both columns move on every UPDATE."""
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+    version = Column(Integer, nullable=False, server_default="1", onupdate=literal_column("version + 1"))
+    # Position in the global change order for GET /sync, set by triggers (sync.py)
+    change_seq = Column(BigInteger, server_default=FetchedValue(), index=True)
+
+class User(Versioned, Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True, nullable=False)
     email = Column(String(100), unique=True, nullable=False)
     password = Column(String(100), nullable=False)
-    teams = relationship("Team", secondary=user_team, back_populates="members")
+    teams = relationship("Team", secondary=user_team, back_populates="members", passive_deletes=True)
 
-class Team(Base):
+class Team(Versioned, Base):
     __tablename__ = "teams"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
     description = Column(String(300))
-    members = relationship("User", secondary=user_team, back_populates="teams")
-    projects = relationship("Project", back_populates="team")
+    members = relationship("User", secondary=user_team, back_populates="teams", passive_deletes=True)
+    projects = relationship("Project", back_populates="team", passive_deletes=True)
 
-class Project(Base):
+class Project(Versioned, Base):
     __tablename__ = "projects"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
     description = Column(String(500))
-    team_id = Column(Integer, ForeignKey("teams.id"))
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="SET NULL"), index=True)
     team = relationship("Team", back_populates="projects")
-    tasks = relationship("Task", back_populates="project")
+    tasks = relationship("Task", back_populates="project", passive_deletes=True)
 
-class Task(Base):
+class Task(Versioned, Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_project_status_priority", "project_id", "status", "priority"),
+        Index("ix_tasks_project_deadline", "project_id", "deadline"),
+        Index("ix_tasks_deadline_id", "deadline", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(100), nullable=False)
     description = Column(String(500))
     status = Column(String(20), default="todo")
     priority = Column(String(20), default="medium")
     deadline = Column(DateTime)
-    project_id = Column(Integer, ForeignKey("projects.id"))
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="SET NULL"))
     project = relationship("Project", back_populates="tasks")
-    comments = relationship("Comment", back_populates="task")
+    comments = relationship("Comment", back_populates="task", passive_deletes=True)
 
-class Comment(Base):
+class Comment(Versioned, Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_task_created_at", "task_id", "created_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     text = Column(String(500), nullable=False)
-    created_at = Column(DateTime, server_default='now()')
-    task_id = Column(Integer, ForeignKey("tasks.id"))
+    created_at = Column(DateTime, server_default=func.now())
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="SET NULL"))
     task = relationship("Task", back_populates="comments")
-    user_id = Column(Integer, ForeignKey("users.id"))
-    user = relationship("User")
\ No newline at end of file
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), index=True)
+    user = relationship("User")
+
+# Task analytics (analytics.py). The history outlives its tasks, so there
+# are no foreign keys to them.
+class TaskStatusTransition(Base):
+    """Append-only: one row per status change, and one with no from_status when a task is created."""
+    __tablename__ = "task_status_transitions"
+    __table_args__ = (
+        Index("ix_task_status_transitions_task_changed_at", "task_id", "changed_at"),
+    )
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    project_id = Column(Integer)
+    from_status = Column(String(20))
+    to_status = Column(String(20), nullable=False)
+    changed_at = Column(DateTime, nullable=False)
+
+class TaskDeadlineMiss(Base):
+    """A deadline that passed with the task open; the key makes recording it idempotent."""
+    __tablename__ = "task_deadline_misses"
+    task_id = Column(Integer, primary_key=True)
+    deadline = Column(DateTime, primary_key=True)
+
+class DailyStats(Base):
+    """Per-day counters for a project or a team ("project" / "team" scope)."""
+    __tablename__ = "daily_stats"
+    scope = Column(String(10), primary_key=True)
+    scope_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    created = Column(Integer, nullable=False, default=0, server_default="0")
+    completed = Column(Integer, nullable=False, default=0, server_default="0")
+    reopened = Column(Integer, nullable=False, default=0, server_default="0")
+    overdue = Column(Integer, nullable=False, default=0, server_default="0")
+
+class DailyCycleTime(Base):
+    """Cycle times of the tasks completed that day, as counts per log-scale bucket."""
+    __tablename__ = "daily_cycle_times"
+    scope = Column(String(10), primary_key=True)
+    scope_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0, server_default="0")
+
+class SyncTombstone(Base):
+    """A deleted row for GET /sync, numbered from the same counter as change_seq."""
+    __tablename__ = "sync_tombstones"
+    seq = Column(BigInteger, primary_key=True, autoincrement=False)
+    entity = Column(String(20), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, server_default=func.now())
+
+# Archive (archive.py): done tasks past ARCHIVE_AFTER_DAYS and their comments,
+# moved out of the live tables with their ids, versions and timestamps
+class ArchivedTask(Base):
+    __tablename__ = "tasks_archive"
+    __table_args__ = (
+        Index("ix_tasks_archive_project_status_priority", "project_id", "status", "priority"),
+        Index("ix_tasks_archive_project_deadline", "project_id", "deadline"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String(100), nullable=False)
+    description = Column(String(500))
+    status = Column(String(20))
+    priority = Column(String(20))
+    deadline = Column(DateTime)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="SET NULL"))
+    project = relationship("Project")
+    comments = relationship("ArchivedComment", back_populates="task")
+    updated_at = Column(DateTime, nullable=False)
+    version = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, nullable=False, server_default=func.now())
+
+class ArchivedComment(Base):
+    __tablename__ = "comments_archive"
+    __table_args__ = (
+        Index("ix_comments_archive_task_created_at", "task_id", "created_at"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    text = Column(String(500), nullable=False)
+    created_at = Column(DateTime)
+    task_id = Column(Integer, ForeignKey("tasks_archive.id"))
+    task = relationship("ArchivedTask", back_populates="comments")
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), index=True)
+    user = relationship("User")
+    updated_at = Column(DateTime, nullable=False)
+    version = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, nullable=False, server_default=func.now())
@@ -0,0 +1,82 @@
+"""Opaque keyset cursors for the list endpoints.
+
+A cursor carries the sort key of the last row of a page, so the next page is
+a range scan on the (indexed) sort columns instead of an OFFSET that reads
+and discards every skipped row. Every ordering ends with ``id`` so keys are
+unique; a leading non-id column sorts NULLs last.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Mapping, Optional, Sequence
+from fastapi import Response
+from sqlalchemy import DateTime, or_, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class InvalidCursorError(ValueError):
+    pass
+
+def encode_cursor(keys: Sequence[str], values: Sequence[Any]) -> str:
+    payload = json.dumps(
+        {"k": list(keys), "v": [v.isoformat() if isinstance(v, datetime) else v for v in values]},
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, keys: Sequence[str]) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["k"] != list(keys) or len(payload["v"]) != len(keys):
+            raise InvalidCursorError("Cursor does not match the requested ordering")
+        return payload["v"]
+    except InvalidCursorError:
+        raise
+    except (ValueError, KeyError, TypeError) as exc:
+        raise InvalidCursorError("Malformed cursor") from exc
+
+def _coerce(column, value):
+    if value is not None and isinstance(column.type, DateTime):
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError) as exc:
+            raise InvalidCursorError("Malformed cursor") from exc
+    return value
+
+def keyset(query, source, keys: Sequence[str], cursor: Optional[str] = None):
+    """Order ``query`` by ``keys`` of ``source`` and resume after ``cursor``."""
+    columns = [source.c[key] for key in keys]
+    query = query.order_by(*(
+        column.asc() if key == "id" else column.asc().nulls_last()
+        for key, column in zip(keys, columns)
+    ))
+    if not cursor:
+        return query
+    values = [_coerce(c, v) for c, v in zip(columns, decode_cursor(cursor, keys))]
+    if len(columns) == 1:
+        return query.filter(columns[0] > values[0])
+    column, id_column = columns
+    value, last_id = values
+    if value is None:
+        return query.filter(column.is_(None), id_column > last_id)
+    return query.filter(or_(
+        tuple_(column, id_column) > tuple_(value, last_id),
+        column.is_(None)
+    ))
+
+def _key_value(item, key: str):
+    if isinstance(item, Mapping):
+        return item[key]
+    return getattr(item, key)
+
+def next_cursor(items: Sequence, keys: Sequence[str], limit: int) -> Optional[str]:
+    if limit <= 0 or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(keys, [_key_value(last, key) for key in keys])
+
+def set_next_cursor(response: Response, items: Sequence, keys: Sequence[str], limit: int):
+    cursor = next_cursor(items, keys, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
@@ -0,0 +1,143 @@
+"""Ranked full-text search over task titles/descriptions and comment text.
+
+PostgreSQL: generated ``search_vector`` tsvector columns with GIN indexes,
+matched with ``websearch_to_tsquery``, plus pg_trgm ``<%`` (word similarity)
+on titles and comment text so misspelled words still find their rows. The
+rank is the better of ``ts_rank`` and the trigram similarity.
+
+SQLite (local and test setups): external-content FTS5 tables kept in sync
+by triggers, matched with prefix terms and ranked by ``bm25``. There is no
+typo tolerance there.
+
+The search objects are created with the tables by ``create_all``; existing
+PostgreSQL databases get them from migrations/0004_search.sql. Results are
+ordered by rank, then type and id, and paged with a keyset cursor on those.
+"""
+import re
+from typing import List, Optional
+from sqlalchemy import DDL, and_, event, func, literal, literal_column, or_, select, tuple_, union_all
+from sqlalchemy import column as sql_column, table as sql_table
+from sqlalchemy.orm import Session
+import models
+from pagination import decode_cursor
+
+CURSOR_KEYS = ("rank", "type", "id")
+
+class InvalidSearchError(ValueError):
+    pass
+
+_POSTGRES_DDL = {
+    models.Task.__table__: [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_search_vector ON tasks USING gin (search_vector)",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_title_trgm ON tasks USING gin (title gin_trgm_ops)",
+    ],
+    models.Comment.__table__: [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "ALTER TABLE comments ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "to_tsvector('simple', coalesce(text, ''))) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_comments_search_vector ON comments USING gin (search_vector)",
+        "CREATE INDEX IF NOT EXISTS ix_comments_text_trgm ON comments USING gin (text gin_trgm_ops)",
+    ],
+}
+
+def _fts5_ddl(table: str, columns: List[str]) -> List[str]:
+    fts = f"{table}_fts"
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{column}" for column in columns)
+    old = ", ".join(f"old.{column}" for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', content_rowid='id')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); END",
+        # Only when indexed text changes; sync.py stamps rows with an UPDATE of their own
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {names} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END",
+    ]
+
+_SQLITE_DDL = {
+    models.Task.__table__: _fts5_ddl("tasks", ["title", "description"]),
+    models.Comment.__table__: _fts5_ddl("comments", ["text"]),
+}
+
+for _dialect, _ddl in (("postgresql", _POSTGRES_DDL), ("sqlite", _SQLITE_DDL)):
+    for _table, _statements in _ddl.items():
+        for _statement in _statements:
+            event.listen(_table, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
+def _postgres_hits(q: str):
+    tasks, comments = models.Task.__table__, models.Comment.__table__
+    query = func.websearch_to_tsquery("simple", q)
+    task_vector = literal_column("tasks.search_vector")
+    comment_vector = literal_column("comments.search_vector")
+    return (
+        select(
+            literal("task").label("type"),
+            tasks.c.id,
+            tasks.c.id.label("task_id"),
+            tasks.c.title.label("text"),
+            func.greatest(func.ts_rank(task_vector, query), func.word_similarity(q, tasks.c.title)).label("rank"),
+        ).where(or_(task_vector.op("@@")(query), literal(q).op("<%")(tasks.c.title))),
+        select(
+            literal("comment").label("type"),
+            comments.c.id,
+            comments.c.task_id,
+            comments.c.text,
+            func.greatest(func.ts_rank(comment_vector, query), func.word_similarity(q, comments.c.text)).label("rank"),
+        ).where(or_(comment_vector.op("@@")(query), literal(q).op("<%")(comments.c.text))),
+    )
+
+def _fts5_query(q: str) -> Optional[str]:
+    # Quote every word so user input can't use FTS5 syntax; * makes it a prefix match
+    words = re.findall(r"\w+", q)
+    return " ".join(f'"{word}"*' for word in words) or None
+
+def _sqlite_hits(q: str):
+    tasks, comments = models.Task.__table__, models.Comment.__table__
+    match = _fts5_query(q)
+    if match is None:
+        raise InvalidSearchError("Search query must contain at least one word")
+    hits = []
+    for kind, table, task_id, text in (
+        ("task", tasks, tasks.c.id, tasks.c.title),
+        ("comment", comments, comments.c.task_id, comments.c.text),
+    ):
+        fts = sql_table(f"{table.name}_fts", sql_column("rowid"))
+        fts_name = literal_column(fts.name)
+        hits.append(
+            select(
+                literal(kind).label("type"),
+                table.c.id,
+                task_id.label("task_id"),
+                text.label("text"),
+                # bm25 is lower for better matches
+                (-func.bm25(fts_name)).label("rank"),
+            )
+            .select_from(table.join(fts, fts.c.rowid == table.c.id))
+            .where(fts_name.op("MATCH")(match))
+        )
+    return hits
+
+def search(db: Session, q: str, kinds: List[str], limit: int = 20, cursor: Optional[str] = None) -> List[dict]:
+    q = q.strip()
+    if not q:
+        raise InvalidSearchError("Search query must not be empty")
+    builder = _sqlite_hits if db.get_bind().dialect.name == "sqlite" else _postgres_hits
+    parts = dict(zip(("task", "comment"), builder(q)))
+    hits = union_all(*(parts[kind] for kind in kinds)).subquery("hits")
+
+    stmt = select(hits)
+    if cursor:
+        rank, kind, last_id = decode_cursor(cursor, CURSOR_KEYS)
+        stmt = stmt.where(or_(
+            hits.c.rank < rank,
+            and_(hits.c.rank == rank, tuple_(hits.c.type, hits.c.id) > tuple_(kind, last_id))
+        ))
+    stmt = stmt.order_by(hits.c.rank.desc(), hits.c.type, hits.c.id).limit(limit)
+    return [dict(row) for row in db.execute(stmt).mappings()]
@@ -0,0 +1,188 @@
+"""Delta sync for offline clients: ``GET /sync?since=<token>``.
+
+Every user, team, project, task and comment row carries ``change_seq``,
+set from one global counter by database triggers on each insert and
+update. Every delete leaves a row in ``sync_tombstones``, numbered from the
+same counter. Being triggers, they also catch writes that don't go through
+crud.py: imports, archiving and the FK ``ON DELETE SET NULL`` updates. A
+sync is one range scan on ``ix_<table>_change_seq`` per table, so it costs
+what changed since the token, not the size of the data.
+
+Archiving moves rows to the archive tables rather than deleting them, so
+its deletes run inside ``without_tombstones`` and leave none: the rows
+stay readable with ``?include_archived=true``. The switch is a
+transaction-local setting on PostgreSQL and a flag row in
+``sync_skip_tombstones`` on SQLite, whose triggers can't read settings.
+
+The token is the counter value below which the client has seen every
+change. On PostgreSQL (sequence ``change_seq``) a number is taken when a
+row is written but only becomes visible at commit, so a transaction still
+running could commit below a number another one already committed.
+Writers hold a shared advisory lock from their first stamp until they
+finish; a sync reads the counter, waits for the transactions that held the
+lock at that moment, and serves changes up to that value only. SQLite has
+a single writer, so its counter (table ``sync_counter``) is always settled.
+
+The triggers are created with the tables by ``create_all``; existing
+PostgreSQL databases get them from migrations/0007_sync.sql and
+0009_archive_tombstones.sql.
+"""
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from sqlalchemy import DDL, Sequence, event, select, text
+from sqlalchemy.orm import Session
+import config
+import models
+import schemas
+from pagination import InvalidCursorError, decode_cursor, encode_cursor
+
+TOKEN_KEYS = ("change_seq",)
+# pg_advisory_xact_lock_shared key held by transactions that stamped rows
+WRITERS_LOCK_KEY = 7_140_323
+# Transaction-local PostgreSQL setting that turns the tombstone trigger off
+SKIP_TOMBSTONES_SETTING = "teamwork.skip_tombstones"
+
+# Entity name -> model and the fields sent for it (never the password)
+ENTITIES = {
+    "user": (models.User, list(schemas.UserBase.model_fields)),
+    "team": (models.Team, list(schemas.TeamBase.model_fields)),
+    "project": (models.Project, list(schemas.ProjectBase.model_fields)),
+    "task": (models.Task, list(schemas.TaskOut.model_fields)),
+    "comment": (models.Comment, list(schemas.CommentBase.model_fields) + ["created_at"]),
+}
+
+class SyncUnavailableError(Exception):
+    """Writers that could hide changes below the counter didn't finish in time."""
+
+# Created with the tables by create_all; migrations/0007_sync.sql for existing databases
+change_seq = Sequence("change_seq", metadata=models.Base.metadata)
+
+_POSTGRES_FUNCTIONS = [
+    "CREATE OR REPLACE FUNCTION sync_stamp() RETURNS trigger AS $$ BEGIN "
+    f"PERFORM pg_advisory_xact_lock_shared({WRITERS_LOCK_KEY}); "
+    "NEW.change_seq := nextval('change_seq'); RETURN NEW; END $$ LANGUAGE plpgsql",
+    "CREATE OR REPLACE FUNCTION sync_tombstone() RETURNS trigger AS $$ BEGIN "
+    f"IF current_setting('{SKIP_TOMBSTONES_SETTING}', true) = 'on' THEN RETURN OLD; END IF; "
+    f"PERFORM pg_advisory_xact_lock_shared({WRITERS_LOCK_KEY}); "
+    "INSERT INTO sync_tombstones (seq, entity, entity_id, deleted_at) "
+    "VALUES (nextval('change_seq'), TG_ARGV[0], OLD.id, now()); RETURN OLD; END $$ LANGUAGE plpgsql",
+]
+
+def _postgres_triggers(table: str, entity: str) -> List[str]:
+    return [
+        f"DROP TRIGGER IF EXISTS {table}_sync_stamp ON {table}",
+        f"CREATE TRIGGER {table}_sync_stamp BEFORE INSERT OR UPDATE ON {table} "
+        "FOR EACH ROW EXECUTE FUNCTION sync_stamp()",
+        f"DROP TRIGGER IF EXISTS {table}_sync_tombstone ON {table}",
+        f"CREATE TRIGGER {table}_sync_tombstone AFTER DELETE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION sync_tombstone('{entity}')",
+    ]
+
+_SQLITE_COUNTER = [
+    "CREATE TABLE IF NOT EXISTS sync_counter (value INTEGER NOT NULL)",
+    "INSERT INTO sync_counter (value) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM sync_counter)",
+    "CREATE TABLE IF NOT EXISTS sync_skip_tombstones (active INTEGER NOT NULL)",
+]
+
+def _sqlite_triggers(table: str, entity: str) -> List[str]:
+    # SQLite triggers can't assign NEW, so the row is stamped right after the write
+    stamp = (
+        "UPDATE sync_counter SET value = value + 1; "
+        f"UPDATE {table} SET change_seq = (SELECT value FROM sync_counter) WHERE id = new.id; END"
+    )
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_sync_ai AFTER INSERT ON {table} BEGIN {stamp}",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_sync_au AFTER UPDATE ON {table} "
+        f"WHEN new.change_seq IS old.change_seq BEGIN {stamp}",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_sync_ad AFTER DELETE ON {table} "
+        "WHEN NOT EXISTS (SELECT 1 FROM sync_skip_tombstones) BEGIN "
+        "UPDATE sync_counter SET value = value + 1; "
+        "INSERT INTO sync_tombstones (seq, entity, entity_id, deleted_at) "
+        f"VALUES ((SELECT value FROM sync_counter), '{entity}', old.id, CURRENT_TIMESTAMP); END",
+    ]
+
+for _statement in _POSTGRES_FUNCTIONS:
+    event.listen(models.Base.metadata, "before_create", DDL(_statement).execute_if(dialect="postgresql"))
+for _statement in _SQLITE_COUNTER:
+    event.listen(models.Base.metadata, "before_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _entity, (_model, _) in ENTITIES.items():
+    _table = _model.__table__
+    for _dialect, _triggers in (("postgresql", _postgres_triggers), ("sqlite", _sqlite_triggers)):
+        for _statement in _triggers(_table.name, _entity):
+            event.listen(_table, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
+@contextmanager
+def without_tombstones(db: Session):
+    """Deletes in the block, which must commit or roll back with it, leave no tombstones."""
+    if db.get_bind().dialect.name == "postgresql":
+        setting = {"name": SKIP_TOMBSTONES_SETTING}
+        db.execute(text("SELECT set_config(:name, 'on', true)"), setting)
+        yield
+        db.execute(text("SELECT set_config(:name, 'off', true)"), setting)
+    else:
+        db.execute(text("INSERT INTO sync_skip_tombstones (active) VALUES (1)"))
+        yield
+        db.execute(text("DELETE FROM sync_skip_tombstones"))
+
+# Reading
+def _settled_seq(db: Session) -> int:
+    """The highest change number below which every change is committed (or rolled back)."""
+    if db.get_bind().dialect.name != "postgresql":
+        return db.scalar(text("SELECT value FROM sync_counter"))
+    lock = {"key": WRITERS_LOCK_KEY}
+    # Counter first: anyone holding a number up to it took the lock before taking it
+    seq = db.scalar(text("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM change_seq"))
+    writers = db.scalars(text(
+        "SELECT virtualtransaction FROM pg_locks WHERE locktype = 'advisory' AND classid = 0 "
+        "AND objid = :key AND objsubid = 1 AND granted AND pid <> pg_backend_pid()"
+    ), lock).all()
+    deadline = time.monotonic() + config.SYNC_SETTLE_TIMEOUT_MS / 1000
+    while writers:
+        if time.monotonic() > deadline:
+            raise SyncUnavailableError("Writes are still in progress, retry shortly")
+        time.sleep(0.005)
+        writers = db.scalars(text(
+            "SELECT virtualtransaction FROM pg_locks WHERE locktype = 'advisory' AND classid = 0 "
+            "AND objid = :key AND objsubid = 1 AND granted AND virtualtransaction = ANY(:writers)"
+        ), {**lock, "writers": writers}).all()
+    # Reads after this see everything those writers committed
+    db.commit()
+    return seq
+
+def changes(db: Session, since: Optional[str], limit: int) -> Dict[str, Any]:
+    """Rows written and deleted after ``since``, in change order, at most ``limit`` of them."""
+    after = decode_cursor(since, TOKEN_KEYS)[0] if since else 0
+    if not isinstance(after, int):
+        raise InvalidCursorError("Malformed token")
+    until = _settled_seq(db)
+
+    items = []
+    for entity, (model, fields) in ENTITIES.items():
+        table = model.__table__
+        columns = [table.c.id, *(table.c[name] for name in fields), table.c.version, table.c.updated_at]
+        rows = db.execute(
+            select(table.c.change_seq, *columns)
+            .where(table.c.change_seq > after, table.c.change_seq <= until)
+            .order_by(table.c.change_seq)
+            .limit(limit + 1)
+        ).mappings()
+        for row in rows:
+            data = dict(row)
+            seq = data.pop("change_seq")
+            items.append({"seq": seq, "type": entity, "op": "upsert", "id": data["id"], "data": data})
+    tombstones = models.SyncTombstone
+    for tombstone in db.scalars(
+        select(tombstones)
+        .where(tombstones.seq > after, tombstones.seq <= until, tombstones.entity.in_(ENTITIES))
+        .order_by(tombstones.seq)
+        .limit(limit + 1)
+    ):
+        items.append({"seq": tombstone.seq, "type": tombstone.entity, "op": "delete", "id": tombstone.entity_id})
+
+    items.sort(key=lambda item: item["seq"])
+    has_more = len(items) > limit
+    if has_more:
+        del items[limit:]
+        until = items[-1]["seq"]
+    return {"changes": items, "next_token": encode_cursor(TOKEN_KEYS, [until]), "has_more": has_more}
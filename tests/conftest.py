@@ -0,0 +1,59 @@
+"""Test setup: the app runs against a throwaway SQLite database.
+
+The app modules import each other as top-level modules (``import crud``),
+so app/ goes on sys.path, and the environment is set before ``main`` is
+imported: config.py reads it at import time.
+"""
+import os
+import sys
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="teamwork-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ["DB_MODE"] = "sync"
+os.environ["DEADLINES_ENABLED"] = "false"
+os.environ["ARCHIVE_ENABLED"] = "false"
+os.environ["CACHE_BACKEND"] = "none"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+import cache
+import database
+import main
+import models
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    """Empty every table after each test; ids start from 1 again."""
+    yield
+    with database.engine.begin() as connection:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            connection.execute(delete(table))
+        # The deletes above leave sync tombstones behind
+        connection.execute(delete(models.SyncTombstone.__table__))
+    cache.local.clear()
+
+@pytest.fixture
+def project(client):
+    """User 1 in team 1, which owns project 1."""
+    client.post("/users/", json={"username": "alice", "email": "alice@example.com", "password": "Secret123!"})
+    client.post("/teams/", json={"name": "Team A"})
+    client.post("/teams/1/members/1")
+    client.post("/projects/", json={"name": "Project A", "team_id": 1})
+    return 1
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+import crud
+import models
+
+def _archive_all(db):
+    return crud.archive_done_tasks(db, timedelta(0), batch_size=100)
+
+def test_done_tasks_move_with_their_comments(client, db, project):
+    for title, task_status in [("Old", "done"), ("Open", "todo")]:
+        client.post("/tasks/", json={"title": title, "status": task_status, "priority": "low", "project_id": project})
+    client.post("/comments/", json={"text": "Shipped", "task_id": 1, "user_id": 1})
+    client.post("/comments/", json={"text": "Pending", "task_id": 2, "user_id": 1})
+
+    assert _archive_all(db) == (1, 1)
+    assert [t["title"] for t in client.get("/tasks/").json()] == ["Open"]
+    assert [c["text"] for c in client.get("/comments/").json()] == ["Pending"]
+    assert client.get("/tasks/1").status_code == 404
+
+    archived = client.get("/tasks/", params={"include_archived": "true", "include": "comments"}).json()
+    assert [t["title"] for t in archived] == ["Old", "Open"]
+    assert [c["text"] for c in archived[0]["comments"]] == ["Shipped"]
+    comments = client.get("/comments/", params={"include_archived": "true"}).json()
+    assert [c["text"] for c in comments] == ["Shipped", "Pending"]
+
+def test_archived_task_past_its_deadline_is_listed(client, db, project):
+    # The API only accepts future deadlines; archived tasks are usually long past theirs
+    deadline = datetime.utcnow() - timedelta(days=30)
+    db.add_all([
+        models.Task(title="Old", status="done", priority="low", deadline=deadline, project_id=project),
+        models.Task(title="Late", status="todo", priority="low", deadline=deadline, project_id=project),
+    ])
+    db.commit()
+    _archive_all(db)
+
+    response = client.get("/tasks/", params={"include_archived": "true"})
+    assert response.status_code == 200
+    assert [(t["title"], t["deadline"]) for t in response.json()] == [
+        ("Old", deadline.isoformat()), ("Late", deadline.isoformat())
+    ]
+    assert client.get("/tasks/2").json()["title"] == "Late"
+
+def test_archived_pages_follow_the_cursor(client, db, project):
+    for i in range(5):
+        client.post("/tasks/", json={
+            "title": f"Task {i}", "status": "done" if i % 2 == 0 else "todo", "priority": "low", "project_id": project
+        })
+    _archive_all(db)
+
+    first = client.get("/tasks/", params={"include_archived": "true", "limit": 3})
+    second = client.get("/tasks/", params={
+        "include_archived": "true", "limit": 3, "cursor": first.headers["X-Next-Cursor"]
+    })
+    titles = [t["title"] for t in first.json() + second.json()]
+    assert titles == [f"Task {i}" for i in range(5)]
+
+def test_archiving_leaves_no_sync_tombstones(client, db, project):
+    for title, task_status in [("Old", "done"), ("Gone", "todo")]:
+        client.post("/tasks/", json={"title": title, "status": task_status, "priority": "low", "project_id": project})
+    client.post("/comments/", json={"text": "Shipped", "task_id": 1, "user_id": 1})
+    token = client.get("/sync").json()["next_token"]
+
+    assert _archive_all(db) == (1, 1)
+    assert client.get("/sync", params={"since": token}).json()["changes"] == []
+    # Deletes outside the archiver still leave them
+    client.delete("/tasks/2")
+    changes = client.get("/sync", params={"since": token}).json()["changes"]
+    assert [(c["type"], c["op"], c["id"]) for c in changes] == [("task", "delete", 2)]
+
+def test_only_tasks_done_long_enough_ago_move(client, db, project):
+    for title in ("Old", "Recent"):
+        client.post("/tasks/", json={"title": title, "status": "done", "priority": "low", "project_id": project})
+    # updated_at is written by the database clock; age one task by the same clock
+    db.execute(text("UPDATE tasks SET updated_at = datetime('now', '-3 days') WHERE id = 1"))
+    db.commit()
+
+    assert crud.archive_done_tasks(db, timedelta(days=2), batch_size=100) == (1, 0)
+    assert [t["title"] for t in client.get("/tasks/").json()] == ["Recent"]
@@ -0,0 +1,51 @@
+def test_bulk_create_reports_each_item(client, project):
+    response = client.post("/tasks/bulk", json=[
+        {"title": "Write spec", "priority": "high", "project_id": project},
+        {"title": "NO CAPS", "priority": "high", "project_id": project},
+        {"title": "Orphan", "priority": "low", "project_id": 99},
+        {"title": "Review spec", "priority": "low", "project_id": project},
+    ])
+    assert response.status_code == 200
+    results = response.json()
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert [r["status"] for r in results] == ["created", "error", "error", "created"]
+    assert "title" in results[1]["error"]
+    assert results[2]["error"] == "Project not found"
+    assert [t["title"] for t in client.get("/tasks/").json()] == ["Write spec", "Review spec"]
+
+def test_bulk_update_skips_missing_tasks(client, project):
+    client.post("/tasks/bulk", json=[
+        {"title": "One", "priority": "low", "project_id": project},
+        {"title": "Two", "priority": "low", "project_id": project},
+    ])
+    response = client.patch("/tasks/bulk", json=[
+        {"id": 2, "title": "Two, done", "status": "done", "priority": "high", "project_id": project},
+        {"id": 42, "title": "Ghost", "priority": "low", "project_id": project},
+        {"title": "No id", "priority": "low", "project_id": project},
+    ])
+    results = response.json()
+    assert [(r["id"], r["status"]) for r in results] == [(2, "updated"), (42, "error"), (None, "error")]
+    assert results[1]["error"] == "Task not found"
+    task = client.get("/tasks/2").json()
+    assert (task["title"], task["status"], task["priority"]) == ("Two, done", "done", "high")
+
+def test_bulk_delete_reports_unknown_ids(client, project):
+    client.post("/tasks/bulk", json=[{"title": "One", "priority": "low", "project_id": project}])
+    response = client.request("DELETE", "/tasks/bulk", json={"ids": [1, 7]})
+    assert [(r["id"], r["status"]) for r in response.json()] == [(1, "deleted"), (7, "error")]
+    assert client.get("/tasks/1").status_code == 404
+
+def test_bulk_comments_are_moderated_per_item(client, project):
+    client.post("/tasks/", json={"title": "Task", "priority": "low", "project_id": project})
+    response = client.post("/comments/bulk", json=[
+        {"text": "Looks good", "task_id": 1, "user_id": 1},
+        {"text": "see http://spam.example", "task_id": 1, "user_id": 1},
+        {"text": "Nobody's task", "task_id": 5, "user_id": 1},
+    ])
+    assert [r["status"] for r in response.json()] == ["created", "error", "error"]
+    assert [c["text"] for c in client.get("/comments/").json()] == ["Looks good"]
+
+def test_bulk_size_is_capped(client, monkeypatch):
+    monkeypatch.setattr("config.BULK_MAX_ITEMS", 2)
+    response = client.post("/tasks/bulk", json=[{}, {}, {}])
+    assert response.status_code == 413
@@ -0,0 +1,52 @@
+import json
+import sys
+
+import pytest
+
+import cache
+import crud
+import models
+
+@pytest.fixture
+def shared(monkeypatch):
+    backend = cache.MemoryBackend()
+    monkeypatch.setattr(cache, "shared", backend)
+    return backend
+
+def _key(model, row_id):
+    return cache._key(model, row_id)
+
+def test_passwords_stay_out_of_the_cache(client, db, shared, monkeypatch):
+    # The create leaves an invalidation marker; let it lapse at once
+    monkeypatch.setattr("config.CACHE_INVALIDATION_HOLD_SECONDS", 0)
+    client.post("/users/", json={"username": "alice", "email": "alice@example.com", "password": "Secret123!"})
+    assert client.get("/users/1").status_code == 200
+
+    assert "password" not in cache.local.get(_key(models.User, 1))
+    assert "password" not in json.loads(shared.get(_key(models.User, 1)))
+    # A cached user still has the column when something reads it
+    assert crud.get_user(db, 1).password
+
+def test_load_racing_an_invalidate_is_not_stored(client, db, shared, project):
+    client.post("/tasks/", json={"title": "Task one", "priority": "low", "project_id": project})
+
+    def load():
+        task = db.query(models.Task).filter(models.Task.id == 1).first()
+        # A write commits and invalidates after the load read the row
+        cache.invalidate(models.Task, 1)
+        return task
+
+    assert cache.get(db, models.Task, 1, load).title == "Task one"
+    assert cache.local.get(_key(models.Task, 1)) is None
+    assert not shared.get(_key(models.Task, 1))
+
+def test_writes_drop_the_cached_row(client, shared, project):
+    client.post("/tasks/", json={"title": "Task one", "priority": "low", "project_id": project})
+    assert client.get("/tasks/1").json()["title"] == "Task one"
+    client.put("/tasks/1", json={"title": "Task renamed", "priority": "low", "project_id": project})
+    assert client.get("/tasks/1").json()["title"] == "Task renamed"
+
+def test_redis_backend_without_the_package_is_a_config_error(monkeypatch):
+    monkeypatch.setitem(sys.modules, "redis", None)
+    with pytest.raises(ValueError, match="redis package"):
+        cache.RedisBackend("redis://localhost:6379/0")
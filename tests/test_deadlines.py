@@ -0,0 +1,93 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import deadlines
+import events
+
+@pytest.fixture
+def scheduler():
+    """A scheduler of its own with a memory sink; not watching the broker, as if events were off."""
+    return deadlines.DeadlineScheduler(
+        [deadlines.MemorySink()],
+        reminder=timedelta(minutes=60),
+        horizon=timedelta(hours=24),
+        catchup=timedelta(minutes=5),
+        rescan=timedelta(minutes=5)
+    )
+
+def _load(scheduler):
+    asyncio.run(scheduler._extend_window(datetime.now()))
+
+def _import_task(client, project, deadline):
+    record = {"id": 10, "title": "Imported", "priority": "low", "deadline": deadline.isoformat(), "project_id": project}
+    response = client.post(
+        "/import", params={"entity": "tasks"}, content=json.dumps(record) + "\n",
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.json()["inserted"] == 1
+
+def _fire(scheduler, at):
+    notices = scheduler._pop_due(at)
+    scheduler._send(notices)
+    return [(notice.type, notice.task_id) for notice in scheduler.sinks[0].notices]
+
+def test_rescan_schedules_imports_inside_the_loaded_window(client, project, scheduler):
+    _load(scheduler)
+    deadline = datetime.now().replace(microsecond=0) + timedelta(hours=2)
+    _import_task(client, project, deadline)
+    assert scheduler.timer_count() == 0
+
+    _load(scheduler)
+    assert _fire(scheduler, deadline) == [(deadlines.DUE_SOON, 10), (deadlines.OVERDUE, 10)]
+
+def test_rescan_does_not_repeat_sent_notices(client, project, scheduler):
+    # Inside the reminder lead already, so only the overdue notice is due
+    deadline = datetime.now().replace(microsecond=0) + timedelta(minutes=30)
+    _import_task(client, project, deadline)
+    _load(scheduler)
+    assert _fire(scheduler, deadline) == [(deadlines.OVERDUE, 10)]
+
+    _load(scheduler)
+    assert scheduler.timer_count() == 0
+    assert _fire(scheduler, deadline + timedelta(minutes=1)) == [(deadlines.OVERDUE, 10)]
+
+def test_rescan_drops_tasks_deleted_without_an_event(client, project, scheduler):
+    _import_task(client, project, datetime.now() + timedelta(hours=2))
+    _load(scheduler)
+    assert scheduler.timer_count() == 1
+
+    client.delete("/tasks/10")
+    _load(scheduler)
+    assert scheduler.timer_count() == 0
+
+def test_events_of_tasks_without_a_project_reach_the_scheduler(client, project, scheduler, monkeypatch):
+    deadline = (datetime.now() + timedelta(hours=2)).isoformat()
+    client.post("/tasks/", json={"title": "Orphaned", "priority": "low", "deadline": deadline, "project_id": project})
+    client.delete("/projects/1")
+    _load(scheduler)
+    assert scheduler._tasks[1].project_id is None
+
+    monkeypatch.setattr(events.broker, "_watchers", [scheduler.on_event])
+    client.delete("/tasks/1")
+    # Delivery hops onto the app's event loop after the commit
+    wait_until = time.monotonic() + 5
+    while scheduler.timer_count() and time.monotonic() < wait_until:
+        time.sleep(0.01)
+    assert scheduler.timer_count() == 0
+
+def test_scheduler_stands_down_when_the_lock_is_lost(client, project, scheduler):
+    deadline = (datetime.now() + timedelta(hours=2)).isoformat()
+    client.post("/tasks/", json={"title": "Task one", "priority": "low", "deadline": deadline, "project_id": project})
+    checks = iter([True, False])
+
+    async def run():
+        # The first window loads; the rescan then finds the lock gone
+        scheduler.rescan = timedelta(0)
+        await scheduler.run(lambda: next(checks))
+    asyncio.run(asyncio.wait_for(run(), 5))
+    assert scheduler.timer_count() == 0
+    assert scheduler._loaded_until is None
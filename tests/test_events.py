@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+import events
+
+@pytest.fixture
+def broker(monkeypatch):
+    """A small broker of its own, so buffer limits are easy to reach."""
+    target = events.Broker(replay_size=3, queue_size=2)
+    monkeypatch.setattr(events, "broker", target)
+    monkeypatch.setattr("config.EVENTS_HEARTBEAT_SECONDS", 0.05)
+    return target
+
+def _event(event_id, project_id=1, kind="task.created"):
+    return events.Event(event_id, project_id, kind, {"id": event_id})
+
+def _take(count, project_id, last_event_id=None, before=None):
+    """The first ``count`` events ``follow`` yields; ``before`` runs after the first item or heartbeat."""
+    async def run():
+        nonlocal before
+        stream = events.follow(project_id, last_event_id)
+        items = []
+        try:
+            async for item in stream:
+                if before is not None:
+                    before()
+                    before = None
+                if item is not None:
+                    items.append(item)
+                if len(items) == count:
+                    return items
+        finally:
+            await stream.aclose()
+    return asyncio.run(asyncio.wait_for(run(), 5))
+
+def test_written_tasks_replay_after_last_event_id(client, project):
+    for title in ("Task one", "Task two", "Task three"):
+        client.post("/tasks/", json={"title": title, "priority": "low", "project_id": project})
+    # Delivery hops onto the app's event loop after the commit
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        created = [e for e in events.broker._recent if e.project_id == project and e.type == "task.created"]
+        if len(created) >= 3:
+            break
+        time.sleep(0.01)
+    created = created[-3:]
+
+    replay = _take(2, project, last_event_id=created[0].id)
+    assert [(e.id, e.data["title"]) for e in replay] == [(e.id, e.data["title"]) for e in created[1:]]
+    assert "id: " in replay[0].sse() and "event: task.created" in replay[0].sse()
+
+def test_replay_skips_other_projects(broker):
+    broker.dispatch([_event(1), _event(2, project_id=2), _event(3)])
+    assert [e.id for e in _take(1, 1, last_event_id=1)] == [3]
+
+def test_gap_beyond_the_buffer_resets(broker):
+    broker.dispatch([_event(event_id) for event_id in range(1, 6)])
+
+    reset = _take(1, 1, last_event_id=1)[0]
+    assert (reset.id, reset.type) == (None, "reset")
+    assert "id:" not in reset.sse()
+    # Right at the edge of the buffer everything missed is still there
+    assert [e.id for e in _take(2, 1, last_event_id=3)] == [4, 5]
+
+def test_lost_events_reset_and_drop_subscribers(broker):
+    broker.dispatch([_event(1), _event(2)])
+
+    # Subscribed and waiting when notifications are lost
+    items = _take(1, 1, before=broker.lost_events)
+    assert items[0].type == "overflow"
+    assert broker.subscriber_count() == 0
+    # Nothing buffered before the loss is trusted any more
+    assert _take(1, 1, last_event_id=1)[0].type == "reset"
+
+def test_slow_subscriber_overflows(broker):
+    def flood():
+        broker.dispatch([_event(event_id) for event_id in range(1, 5)])
+
+    items = _take(3, 1, before=flood)
+    assert [(e.id, e.type) for e in items] == [(1, "task.created"), (2, "task.created"), (None, "overflow")]
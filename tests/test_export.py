@@ -0,0 +1,44 @@
+import csv
+import io
+import json
+
+import pytest
+
+@pytest.fixture
+def exported_project(client, project, monkeypatch):
+    # Several batches per record type
+    monkeypatch.setattr("config.EXPORT_BATCH_SIZE", 2)
+    client.post("/projects/", json={"name": "Project B", "team_id": 1})
+    client.post("/tasks/bulk", json=[
+        {"title": f"Task {i}", "priority": "low", "project_id": project} for i in range(5)
+    ] + [{"title": "Elsewhere", "priority": "low", "project_id": 2}])
+    client.post("/comments/bulk", json=[
+        {"text": f"Comment {i}", "task_id": task_id, "user_id": 1} for i, task_id in enumerate([1, 3, 3, 6])
+    ])
+    return project
+
+def test_ndjson_export_streams_tasks_then_comments(client, exported_project):
+    response = client.get(f"/projects/{exported_project}/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-disposition"] == 'attachment; filename="project-1.ndjson"'
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [(r["type"], r["id"]) for r in records] == [
+        ("task", 1), ("task", 2), ("task", 3), ("task", 4), ("task", 5),
+        ("comment", 1), ("comment", 2), ("comment", 3),
+    ]
+    assert records[0]["title"] == "Task 0"
+    assert records[-1]["text"] == "Comment 2"
+
+def test_csv_export_shares_one_header(client, exported_project):
+    response = client.get(f"/projects/{exported_project}/export", params={"format": "csv"})
+    assert response.headers["content-type"].startswith("text/csv")
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["type"] for row in rows] == ["task"] * 5 + ["comment"] * 3
+    assert rows[0]["title"] == "Task 0" and rows[0]["text"] == ""
+    assert rows[5]["text"] == "Comment 0" and rows[5]["task_id"] == "1"
+
+def test_export_of_a_missing_project(client):
+    assert client.get("/projects/9/export").status_code == 404
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import crud
+import group_commit
+import models
+import schemas
+
+@pytest.fixture
+def task(client, project):
+    client.post("/tasks/", json={"title": "Task one", "priority": "low", "project_id": project})
+    return 1
+
+@pytest.fixture
+def writes():
+    """``crud.insert_comments`` wrapped to record the size of each batch it writes."""
+    sizes = []
+
+    def insert_comments(db, comments):
+        sizes.append(len(comments))
+        return crud.insert_comments(db, comments)
+    return sizes, insert_comments
+
+def _comment(text, task_id):
+    return schemas.CommentBase(text=text, task_id=task_id, user_id=1)
+
+def test_concurrent_comments_share_one_commit(db, task, writes):
+    sizes, write = writes
+    # A long window: the batch closes when it fills up
+    committer = group_commit.GroupCommitter(write, window_seconds=5, max_rows=5)
+    texts = [f"Comment {i}" for i in range(5)]
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        rows = list(pool.map(lambda text: committer.submit(_comment(text, task)), texts))
+
+    assert sizes == [5]
+    # Each caller gets its own row back
+    assert [row.text for row in rows] == texts
+    assert len({row.id for row in rows}) == 5
+    assert sorted(c.text for c in db.query(models.Comment).all()) == texts
+
+def test_window_closes_a_partial_batch(db, task, writes):
+    sizes, write = writes
+    committer = group_commit.GroupCommitter(write, window_seconds=0.01, max_rows=100)
+
+    assert committer.submit(_comment("Alone", task)).text == "Alone"
+    assert committer.submit(_comment("Later", task)).text == "Later"
+    assert sizes == [1, 1]
+
+def test_failed_row_only_fails_its_caller(db, task, writes):
+    sizes, write = writes
+    committer = group_commit.GroupCommitter(write, window_seconds=5, max_rows=3)
+    comments = [_comment("First", task), _comment("Orphan", 99), _comment("Third", task)]
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(committer.submit, comment) for comment in comments]
+
+    # The batch is retried row by row after the foreign key error
+    assert sizes == [3, 1, 1, 1]
+    assert futures[0].result().text == "First"
+    assert isinstance(futures[1].exception(), IntegrityError)
+    assert futures[2].result().text == "Third"
+    assert sorted(c.text for c in db.query(models.Comment).all()) == ["First", "Third"]
+
+def test_endpoint_uses_group_commit(client, task, monkeypatch):
+    submitted = []
+    submit = group_commit.comments.submit
+    monkeypatch.setattr("config.COMMENT_GROUP_COMMIT", True)
+    monkeypatch.setattr(group_commit.comments, "submit", lambda comment: submitted.append(comment) or submit(comment))
+
+    response = client.post("/comments/", json={"text": "Grouped", "task_id": task, "user_id": 1})
+    assert response.status_code == 201
+    assert response.json()["text"] == "Grouped"
+    assert [c.text for c in submitted] == ["Grouped"]
+    assert client.get("/comments/1").json()["text"] == "Grouped"
@@ -0,0 +1,35 @@
+def _etag(response):
+    return {"If-None-Match": response.headers["ETag"]}
+
+def test_unchanged_list_answers_304(client, project):
+    client.post("/tasks/", json={"title": "Task one", "priority": "low", "project_id": project})
+    first = client.get("/tasks/", params={"status": "todo"})
+    again = client.get("/tasks/", params={"status": "todo"}, headers=_etag(first))
+    assert again.status_code == 304
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+    client.put("/tasks/1", json={"title": "Task one", "priority": "high", "project_id": project})
+    assert client.get("/tasks/", params={"status": "todo"}, headers=_etag(first)).status_code == 200
+
+def test_deleting_a_parent_changes_the_child_lists(client, project):
+    client.post("/tasks/", json={"title": "Task one", "priority": "low", "project_id": project})
+    client.post("/comments/", json={"text": "First", "task_id": 1, "user_id": 1})
+    tasks = client.get("/tasks/", params={"status": "todo"})
+    comments = client.get("/comments/", params={"fields": "id,user_id"})
+
+    # ON DELETE SET NULL: the rows stay on these pages with a new value
+    assert client.delete("/projects/1").status_code == 204
+    changed = client.get("/tasks/", params={"status": "todo"}, headers=_etag(tasks))
+    assert changed.status_code == 200
+    assert changed.json()[0]["project_id"] is None
+    assert client.delete("/users/1").status_code == 204
+    changed = client.get("/comments/", params={"fields": "id,user_id"}, headers=_etag(comments))
+    assert changed.status_code == 200
+    assert changed.json() == [{"id": 1, "user_id": None}]
+
+def test_sparse_pages_have_etags(client, project):
+    client.post("/tasks/", json={"title": "Task one", "priority": "low", "project_id": project})
+    first = client.get("/comments/", params={"fields": "id,text"})
+    assert client.get("/comments/", params={"fields": "id,text"}, headers=_etag(first)).status_code == 304
+    tasks = client.get("/tasks/", params={"fields": "id,title"})
+    assert client.get("/tasks/", params={"fields": "id,title"}, headers=_etag(tasks)).status_code == 304
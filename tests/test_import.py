@@ -0,0 +1,57 @@
+import json
+
+def _import(client, entity, body, content_type="application/x-ndjson"):
+    return client.post("/import", params={"entity": entity}, content=body, headers={"Content-Type": content_type})
+
+def _ndjson(records):
+    return "\n".join(json.dumps(record) for record in records) + "\n"
+
+def test_imported_tasks_with_past_deadlines_read_back(client, project):
+    report = _import(client, "tasks", _ndjson([
+        {"id": 10, "title": "Migrated", "status": "done", "priority": "low",
+         "deadline": "2020-01-31T12:00:00", "project_id": project},
+    ])).json()
+    assert (report["inserted"], report["failed"]) == (1, 0)
+
+    for path in ("/tasks/10", "/tasks/", "/users/1/tasks?include_done=true"):
+        response = client.get(path)
+        assert response.status_code == 200, path
+        assert "2020-01-31T12:00:00" in response.text
+
+def test_row_errors_are_reported_by_position(client, project):
+    body = (
+        "id,title,status,priority,deadline,project_id\n"
+        "1,Fine,todo,low,,1\n"
+        "2,Bad status,later,low,,1\n"
+        "3,No project,todo,low,,77\n"
+        "1,Fine again,todo,low,,1\n"
+    )
+    report = _import(client, "tasks", body, "text/csv").json()
+    assert report["entity"] == "tasks"
+    assert (report["processed"], report["inserted"], report["skipped"], report["failed"]) == (4, 1, 1, 2)
+    errors = {error["row"]: error["error"] for error in report["errors"]}
+    assert list(errors) == [2, 3, 4]
+    assert errors[2].startswith("status")
+    assert errors[3] == "Project 77 not found"
+    assert errors[4] == "Duplicate of row 1"
+
+def test_unknown_content_type_is_rejected(client):
+    response = _import(client, "tasks", "<tasks/>", "application/xml")
+    assert response.status_code == 400
+    assert "Unsupported content type" in response.json()["detail"]
+
+def test_body_over_the_limit_is_refused(client, project, monkeypatch):
+    monkeypatch.setattr("config.IMPORT_MAX_BODY_BYTES", 100)
+    body = _ndjson([{"title": f"Task {i}", "priority": "low", "project_id": project} for i in range(5)])
+
+    response = _import(client, "tasks", body)
+    assert response.status_code == 413
+    assert client.get("/tasks/").json() == []
+
+def test_body_without_a_length_is_cut_off_at_the_limit(client, project, monkeypatch):
+    monkeypatch.setattr("config.IMPORT_MAX_BODY_BYTES", 100)
+    lines = [_ndjson([{"title": f"Task {i}", "priority": "low", "project_id": project}]) for i in range(5)]
+
+    # A generator body goes out chunked, without Content-Length
+    response = _import(client, "tasks", (line.encode() for line in lines))
+    assert response.status_code == 413
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+def _walk(client, path, **params):
+    """Every page of ``path`` following X-Next-Cursor; returns the pages."""
+    pages, cursor = [], None
+    while True:
+        response = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+
+def test_task_pages_by_deadline_put_nulls_last(client, project):
+    soon = datetime.utcnow() + timedelta(days=2)
+    for i, deadline in enumerate([soon + timedelta(days=3), None, soon, None, soon + timedelta(days=1)]):
+        client.post("/tasks/", json={
+            "title": f"Task {i}", "priority": "low", "project_id": project,
+            "deadline": deadline.isoformat() if deadline else None
+        })
+
+    pages = _walk(client, "/tasks/", order_by="deadline", limit=2)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    titles = [task["title"] for page in pages for task in page]
+    assert titles == ["Task 2", "Task 4", "Task 0", "Task 1", "Task 3"]
+
+def test_user_pages_cover_every_row_once(client):
+    for i in range(7):
+        client.post("/users/", json={"username": f"user{i}", "email": f"user{i}@example.com", "password": "Secret123!"})
+    pages = _walk(client, "/users/", limit=3)
+    assert [user["username"] for page in pages for user in page] == [f"user{i}" for i in range(7)]
+
+def test_filtered_comment_pages(client, project):
+    client.post("/tasks/", json={"title": "Task one", "priority": "low", "project_id": project})
+    client.post("/tasks/", json={"title": "Task two", "priority": "low", "project_id": project})
+    for i in range(5):
+        client.post("/comments/", json={"text": f"Comment {i}", "task_id": 1, "user_id": 1})
+        client.post("/comments/", json={"text": f"Other {i}", "task_id": 2, "user_id": 1})
+    pages = _walk(client, "/comments/", task_id=1, limit=2)
+    assert [c["text"] for page in pages for c in page] == [f"Comment {i}" for i in range(5)]
+
+def test_bad_cursors_are_rejected(client, project):
+    client.post("/tasks/", json={"title": "Task one", "priority": "low", "project_id": project})
+    client.post("/tasks/", json={"title": "Task two", "priority": "low", "project_id": project})
+    cursor = client.get("/tasks/", params={"limit": 1}).headers["X-Next-Cursor"]
+
+    assert client.get("/tasks/", params={"cursor": "not-a-cursor"}).status_code == 400
+    # A cursor from the id ordering doesn't fit the deadline ordering
+    response = client.get("/tasks/", params={"cursor": cursor, "order_by": "deadline"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursor does not match the requested ordering"
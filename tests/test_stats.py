@@ -0,0 +1,28 @@
+from datetime import date
+
+def _task(client, project, **values):
+    return client.post("/tasks/", json={"title": "Task one", "priority": "low", "project_id": project, **values})
+
+def _put(client, task_id, project, **values):
+    return client.put(f"/tasks/{task_id}", json={"title": "Task one", "priority": "low", "project_id": project, **values})
+
+def test_status_changes_roll_up_per_day(client, project):
+    _task(client, project)
+    _task(client, project)
+    _put(client, 1, project, status="in_progress")
+    _put(client, 1, project, status="done")
+    _put(client, 1, project, status="done")
+    _put(client, 2, project, status="done")
+    _put(client, 2, project, status="todo")
+
+    stats = client.get(f"/projects/{project}/stats").json()
+    today = stats["days"][-1]
+    assert today["day"] == date.today().isoformat()
+    assert (today["created"], today["completed"], today["reopened"]) == (2, 2, 1)
+    assert stats["cycle_time"]["count"] == 2
+    assert today["remaining"] == 1
+    assert client.get("/teams/1/stats").json()["completed"] == 2
+
+def test_update_of_a_missing_task_records_nothing(client, project):
+    assert _put(client, 5, project, status="done").status_code == 404
+    assert client.get(f"/projects/{project}/stats").json()["completed"] == 0
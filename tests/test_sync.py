@@ -0,0 +1,58 @@
+def _sync(client, since=None, **params):
+    if since is not None:
+        params["since"] = since
+    response = client.get("/sync", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+def _ops(page):
+    return [(change["type"], change["op"], change["id"]) for change in page["changes"]]
+
+def test_full_sync_then_deltas(client, project):
+    first = _sync(client)
+    assert _ops(first) == [("user", "upsert", 1), ("team", "upsert", 1), ("project", "upsert", 1)]
+    assert not first["has_more"]
+    assert "password" not in first["changes"][0]["data"]
+
+    client.post("/tasks/", json={"title": "Task one", "priority": "low", "project_id": project})
+    client.put("/tasks/1", json={"title": "Task renamed", "priority": "high", "project_id": project})
+    delta = _sync(client, first["next_token"])
+    # Written twice, sent once, as it is now
+    assert _ops(delta) == [("task", "upsert", 1)]
+    assert delta["changes"][0]["data"]["title"] == "Task renamed"
+
+    assert _sync(client, delta["next_token"])["changes"] == []
+
+def test_deletes_leave_tombstones(client, project):
+    client.post("/tasks/", json={"title": "Task one", "priority": "low", "project_id": project})
+    client.post("/comments/", json={"text": "First", "task_id": 1, "user_id": 1})
+    token = _sync(client)["next_token"]
+
+    client.delete("/comments/1")
+    client.delete("/projects/1")
+    delta = _sync(client, token)
+    assert ("comment", "delete", 1) in _ops(delta)
+    assert ("project", "delete", 1) in _ops(delta)
+    # The task outlives its project, with the reference cleared
+    task = next(c for c in delta["changes"] if c["type"] == "task")
+    assert (task["op"], task["data"]["project_id"]) == ("upsert", None)
+    assert [c["seq"] for c in delta["changes"]] == sorted(c["seq"] for c in delta["changes"])
+
+def test_pages_follow_the_token(client, project):
+    for title in ("Task one", "Task two", "Task three"):
+        client.post("/tasks/", json={"title": title, "priority": "low", "project_id": project})
+    everything = _ops(_sync(client))
+
+    seen, token = [], None
+    while True:
+        page = _sync(client, token, limit=2)
+        assert len(page["changes"]) <= 2
+        seen += _ops(page)
+        token = page["next_token"]
+        if not page["has_more"]:
+            break
+    assert seen == everything
+    assert len(everything) == 6
+
+def test_bad_token_is_rejected(client):
+    assert client.get("/sync", params={"since": "not-a-token"}).status_code == 400